@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+
+from sqlalchemy import select, func, or_, case, cast, BigInteger
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+MODES = ("split", "split+dividend")
+
+
+@dataclass(frozen=True)
+class AdjustmentFactors:
+    """Cumulative backward adjustment as a step function of date_key.
+
+    Rows with date_key < dates[0] are scaled by price[0]/volume[0], rows in
+    [dates[i-1], dates[i]) by price[i]/volume[i], and rows on or after the last
+    corporate action are left as they are.
+    """
+    dates: tuple[int, ...] = ()
+    price: tuple[float, ...] = ()
+    volume: tuple[float, ...] = ()
+
+    def price_factor(self):
+        m = models.FactOhlcv
+        return case(*((m.date_key < d, f) for d, f in zip(self.dates, self.price)), else_=1.0)
+
+    def volume_factor(self):
+        m = models.FactOhlcv
+        return case(*((m.date_key < d, f) for d, f in zip(self.dates, self.volume)), else_=1.0)
+
+    def ohlcv_columns(self) -> dict:
+        """OHLCV output columns with the factors applied in SQL."""
+        m = models.FactOhlcv
+        if not self.dates:
+            return {
+                "traded_date": m.date_key, "open_price": m.open_price, "high_price": m.high_price,
+                "low_price": m.low_price, "close_price": m.close_price, "volume": m.volume,
+            }
+        price = self.price_factor()
+        return {
+            "traded_date": m.date_key,
+            "open_price": m.open_price * price,
+            "high_price": m.high_price * price,
+            "low_price": m.low_price * price,
+            "close_price": m.close_price * price,
+            "volume": cast(func.round(m.volume * self.volume_factor()), BigInteger),
+        }
+
+
+def _cumulate(events: dict[int, tuple[float, float]]) -> AdjustmentFactors:
+    """Turn per-event (price, volume) multipliers into suffix products per interval."""
+    dates = sorted(events)
+    price, volume = [], []
+    p = v = 1.0
+    for d in reversed(dates):
+        p *= events[d][0]
+        v *= events[d][1]
+        price.append(p)
+        volume.append(v)
+    return AdjustmentFactors(tuple(dates), tuple(reversed(price)), tuple(reversed(volume)))
+
+
+@dataclass(frozen=True)
+class _Entry:
+    load_ts: object
+    signature: tuple
+    factors: dict[str, AdjustmentFactors]
+
+
+class AdjustmentCache:
+    """Adjustment factors per (stock_key, source_key).
+
+    Entries are revalidated when the stock/source slice's load_ts moves. The
+    factors themselves are only recomputed when the set of corporate-action
+    rows changed, so a daily price load costs one small signature query.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple[int, int], _Entry] = {}
+
+    @staticmethod
+    def _has_action():
+        m = models.FactOhlcv
+        return or_(m.dividends > 0, m.stock_splits > 0)
+
+    async def _signature(self, db: AsyncSession, stock_key: int, source_key: int) -> tuple:
+        m = models.FactOhlcv
+        res = await db.execute(
+            select(func.count(), func.max(m.date_key), func.max(m.load_ts))
+            .where(m.stock_key == stock_key, m.source_key == source_key, self._has_action())
+        )
+        return tuple(res.one())
+
+    async def _compute(self, db: AsyncSession, stock_key: int, source_key: int) -> dict[str, AdjustmentFactors]:
+        m = models.FactOhlcv
+        prev = aliased(models.FactOhlcv)
+        prev_close = (
+            select(prev.close_price)
+            .where(prev.stock_key == m.stock_key, prev.source_key == m.source_key, prev.date_key < m.date_key)
+            .order_by(prev.date_key.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        res = await db.execute(
+            select(m.date_key, m.dividends, m.stock_splits, prev_close)
+            .where(m.stock_key == stock_key, m.source_key == source_key, self._has_action())
+            .order_by(m.date_key)
+        )
+
+        splits: dict[int, tuple[float, float]] = {}
+        combined: dict[int, tuple[float, float]] = {}
+        for date_key, dividend, split, close in res:
+            price, volume = 1.0, 1.0
+            if split and split > 0 and split != 1:
+                price, volume = 1.0 / split, split
+                splits[date_key] = (price, volume)
+            if dividend and close and close > dividend:
+                price *= 1.0 - dividend / close
+            if (price, volume) != (1.0, 1.0):
+                combined[date_key] = (price, volume)
+        return {"split": _cumulate(splits), "split+dividend": _cumulate(combined)}
+
+    async def get(
+        self, db: AsyncSession, stock_key: int, source_key: int, load_ts, mode: str
+    ) -> AdjustmentFactors:
+        key = (stock_key, source_key)
+        entry = self._entries.get(key)
+        if entry is None or entry.load_ts != load_ts:
+            signature = await self._signature(db, stock_key, source_key)
+            if entry is None or entry.signature != signature:
+                entry = _Entry(load_ts, signature, await self._compute(db, stock_key, source_key))
+            else:
+                entry = _Entry(load_ts, signature, entry.factors)
+            self._entries[key] = entry
+        return entry.factors[mode]
+
+
+adjustment_cache = AdjustmentCache()
@@ -0,0 +1,308 @@
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+import orjson
+from starlette.datastructures import Headers, QueryParams
+from starlette.routing import Match
+
+from memo import BoundedCache
+from metrics import ADMISSION_WAIT_SECONDS, current_stats
+
+# Rows that count as one extra cost unit
+ROWS_PER_UNIT = 1000
+# Trading days per calendar day, to turn a date range into expected rows
+TRADING_DAYS_RATIO = 252 / 365
+
+
+@dataclass(frozen=True)
+class RouteCost:
+    """How expensive a route is, and which limiter pool it is admitted through.
+
+    A request costs `base` units plus one per ROWS_PER_UNIT rows it is expected to
+    return: the smaller of its page size (`limit_param`, defaulting to
+    `default_limit`) and the trading days between start_date and end_date. Routes
+    without a page size assume `unbounded_rows` for an open date range.
+    `streaming` routes hold their units (and a connection) until the client has read
+    the whole body, so they are charged one pool connection's worth instead.
+    `max_concurrent` additionally caps how many requests of the route run at once.
+    """
+    pool: str = "light"
+    base: float = 1.0
+    limit_param: Optional[str] = None
+    default_limit: int = 0
+    unbounded_rows: int = 0
+    streaming: bool = False
+    max_concurrent: Optional[int] = None
+
+
+# Keyed by route path template; unlisted routes are light with cost 1
+ROUTE_COSTS = {
+    "/stock-ohlcv": RouteCost("heavy", limit_param="limit", default_limit=1000),
+    "/stock-ohlcv/batch": RouteCost("heavy", base=4),
+    "/stock-indicators": RouteCost("heavy", unbounded_rows=5000),
+    "/stock-valuation": RouteCost("heavy", unbounded_rows=5000),
+    "/stock-returns": RouteCost("heavy", base=4),
+    "/market/snapshot": RouteCost("heavy"),
+    "/screener": RouteCost("heavy"),
+    "/industries": RouteCost("heavy"),
+    "/industry-aggregates": RouteCost("heavy"),
+    "/export/{dataset}": RouteCost("heavy", streaming=True, max_concurrent=2),
+    "/stock-balance-sheet": RouteCost(limit_param="limit", default_limit=100),
+    "/stock-cashflow": RouteCost(limit_param="limit", default_limit=100),
+    "/stock-income": RouteCost(limit_param="limit", default_limit=100),
+    "/stock-key-ratios": RouteCost(limit_param="limit", default_limit=100),
+    "/stock-recommendations": RouteCost(limit_param="limit", default_limit=100),
+}
+DEFAULT_COST = RouteCost()
+# Never queued or rate limited, so monitoring keeps working under overload
+EXEMPT_ROUTES = {"/metrics"}
+
+
+def _date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    key = int(value)
+    return date(key // 10000, key // 100 % 100, key % 100)
+
+
+def request_cost(route: RouteCost, query: QueryParams) -> float:
+    """Cost units of one request, from its page size and date range."""
+    rows = None
+    if route.limit_param:
+        try:
+            rows = int(query.get(route.limit_param, route.default_limit))
+        except ValueError:
+            rows = route.default_limit
+    try:
+        start, end = _date(query.get("start_date")), _date(query.get("end_date"))
+    except ValueError:
+        # Left for the endpoint to reject
+        start = end = None
+    if start:
+        days = ((end or date.today()) - start).days * TRADING_DAYS_RATIO
+        rows = max(0, int(days)) if rows is None else min(rows, max(0, int(days)))
+    if rows is None:
+        rows = route.unbounded_rows
+    return route.base + rows / ROWS_PER_UNIT
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class WeightedLimiter:
+    """Weighted semaphore with a bounded FIFO wait queue.
+
+    Up to `capacity` cost units run at once, and no request takes more than
+    `max_cost` of them: with the default of half the capacity, the head of the
+    queue waits for half the pool to drain, not for every long-running request
+    to finish. Waiters are admitted strictly in arrival order, so a heavy
+    request isn't starved by a stream of light ones. Arrivals beyond
+    `max_queue` waiters, or waiting longer than `max_wait` seconds, are rejected
+    with 503 right away instead of piling up on the connection pool.
+    """
+
+    def __init__(
+        self, name: str, capacity: float, max_queue: int, max_wait: float, max_cost: Optional[float] = None,
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.max_cost = capacity / 2 if max_cost is None else max_cost
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0.0
+        self._waiters: deque = deque()
+        # Smoothed time a request holds its units, for Retry-After
+        self._hold_seconds = 1.0
+
+    def _retry_after(self) -> float:
+        # Roughly how long until the current queue has drained through the pool
+        return self._hold_seconds * (1 + len(self._waiters) / max(self.capacity, 1))
+
+    async def acquire(self, cost: float) -> float:
+        """Wait for `cost` units (capped at max_cost); returns the units actually taken."""
+        cost = min(cost, self.max_cost)
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+            return cost
+        if len(self._waiters) >= self.max_queue:
+            raise Rejected(503, f"Too many {self.name} requests queued", self._retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (cost, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the wait ended; hand the units back
+                self.release(cost, 0.0)
+            else:
+                waiter.cancel()
+                self._waiters.remove(entry)
+                self._wake()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise Rejected(503, f"Timed out waiting for a {self.name} slot", self._retry_after())
+        return cost
+
+    def release(self, cost: float, held_seconds: float) -> None:
+        self.in_use -= cost
+        if held_seconds:
+            self._hold_seconds += 0.2 * (held_seconds - self._hold_seconds)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.capacity:
+            cost, waiter = self._waiters.popleft()
+            self.in_use += cost
+            waiter.set_result(True)
+
+
+class TokenBuckets:
+    """Per-client token buckets refilled at `rate` cost units per second up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = BoundedCache(max_clients)
+
+    def take(self, client: str, cost: float) -> None:
+        """Spend `cost` tokens; raise Rejected(429) with the wait until enough have refilled."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self._buckets.set(client, (tokens, now))
+            raise Rejected(429, "Rate limit exceeded", (cost - tokens) / self.rate)
+        self._buckets.set(client, (tokens - cost, now))
+
+
+class AdmissionMiddleware:
+    """Pure ASGI admission control in front of the routes.
+
+    Each request is matched to its route, costed from its page size and date
+    range (see ROUTE_COSTS), charged to the client's token bucket when rate
+    limiting is on, then admitted through its route's concurrency limit and its
+    pool's weighted limiter. The units are held until the response body has been
+    sent. Heavy and light routes have separate limiters, so cheap lookups keep
+    their latency while heavy queries saturate theirs. Rejections are JSON
+    {"detail": ...} with Retry-After: 429 for rate limits, 503 for full or timed-out queues.
+
+    `connections` is the number of database connections behind a pool; a
+    streaming request is charged capacity / connections units, less if its
+    route's concurrent streams would otherwise crowd out the largest request.
+    """
+
+    def __init__(
+        self, app, router, capacities: dict[str, float], max_queue: int, max_wait: float,
+        rate: float = 0, burst: float = 0, client_header: Optional[str] = None,
+        connections: Optional[dict[str, int]] = None,
+    ):
+        self.app = app
+        self.router = router
+        self.pools = {
+            name: WeightedLimiter(name, capacity, max_queue, max_wait)
+            for name, capacity in capacities.items() if capacity > 0
+        }
+        self.routes = {
+            path: WeightedLimiter(path, cost.max_concurrent, max_queue, max_wait, max_cost=1)
+            for path, cost in ROUTE_COSTS.items() if cost.max_concurrent
+        }
+        self.stream_costs = {}
+        for path, cost in ROUTE_COSTS.items():
+            pool = self.pools.get(cost.pool)
+            if pool is None or not cost.streaming:
+                continue
+            units = pool.capacity / max(1, (connections or {}).get(cost.pool, 1))
+            if cost.max_concurrent:
+                # Concurrent streams must leave room for the largest request, or the FIFO head stalls behind them
+                units = min(units, (pool.capacity - pool.max_cost) / cost.max_concurrent)
+            self.stream_costs[path] = units
+        self.buckets = TokenBuckets(rate, burst) if rate > 0 else None
+        self.client_header = client_header.lower() if client_header else None
+
+    def _route(self, scope):
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    def _client(self, scope) -> str:
+        if self.client_header:
+            value = Headers(scope=scope).get(self.client_header)
+            if value:
+                # X-Forwarded-For lists the original client first
+                return value.split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        path = getattr(route, "path", None)
+        if path in EXEMPT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        if route is not None:
+            # Lets the metrics middleware label rejected requests by route too
+            scope["route"] = route
+
+        spec = ROUTE_COSTS.get(path, DEFAULT_COST)
+        if spec.streaming:
+            cost = self.stream_costs.get(path, 1.0)
+        else:
+            cost = request_cost(spec, QueryParams(scope["query_string"]))
+        limiters = [l for l in (self.routes.get(path), self.pools.get(spec.pool)) if l is not None]
+        held = []
+        started = time.perf_counter()
+        try:
+            if self.buckets is not None:
+                self.buckets.take(self._client(scope), cost)
+            for limiter in limiters:
+                held.append((limiter, await limiter.acquire(cost if limiter.name == spec.pool else 1)))
+        except BaseException as exc:
+            # Rejected, or the client went away while queued: hand back what was already taken
+            for limiter, units in held:
+                limiter.release(units, 0.0)
+            if not isinstance(exc, Rejected):
+                raise
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started, spec.pool, str(exc.status))
+            await self._reject(send, exc)
+            return
+
+        admitted = time.perf_counter()
+        waited = admitted - started
+        ADMISSION_WAIT_SECONDS.observe(waited, spec.pool, "admitted")
+        stats = current_stats()
+        if stats is not None:
+            stats.queue_seconds += waited
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for limiter, units in held:
+                limiter.release(units, time.perf_counter() - admitted)
+
+    async def _reject(self, send, rejected: Rejected) -> None:
+        body = orjson.dumps({"detail": rejected.detail})
+        await send({
+            "type": "http.response.start",
+            "status": rejected.status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,179 @@
+"""Concurrent HTTP load test against a running API.
+
+Every endpoint is exercised with symbols drawn from /stocks-list. Each worker
+keeps exactly one request in flight, so --concurrency is the number of
+simultaneous requests. Per-endpoint throughput and p50/p95/p99 latency are
+printed and written as JSON so runs can be compared over time.
+
+    uvicorn main:app --workers 4 &
+    python -m bench.load --base-url http://localhost:8000 --source YFIN --concurrency 32 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def scenarios(source: str, industries: list[str], rng: random.Random) -> dict:
+    """Endpoint name -> function(symbol, symbols) returning (method, path, params, json body).
+
+    `industries` come from /industries; without any, the industry-aggregates scenario is left out.
+    """
+    table = {
+        "stocks-list": lambda s, many: ("GET", "/stocks-list", {"limit": 1000}, None),
+        "stock-info": lambda s, many: ("GET", f"/stock-info/{s}", None, None),
+        "stock-profile": lambda s, many: ("GET", f"/stock-profile/{s}", {"source": source}, None),
+        "stock-ohlcv": lambda s, many: ("GET", "/stock-ohlcv", {"symbol": s, "source": source, "limit": 1000}, None),
+        "stock-ohlcv-columnar": lambda s, many: (
+            "GET", "/stock-ohlcv", {"symbol": s, "source": source, "limit": 5000, "format": "columnar"}, None),
+        "stock-ohlcv-weekly": lambda s, many: (
+            "GET", "/stock-ohlcv", {"symbol": s, "source": source, "interval": "week"}, None),
+        "stock-ohlcv-adjusted": lambda s, many: (
+            "GET", "/stock-ohlcv", {"symbol": s, "source": source, "adjusted": "split+dividend"}, None),
+        "stock-ohlcv-latest": lambda s, many: ("GET", f"/stock-ohlcv/latest/{s}", {"source": source}, None),
+        "stock-ohlcv-batch": lambda s, many: (
+            "POST", "/stock-ohlcv/batch", None, {"symbols": many, "source": source, "limit": 250}),
+        "stock-indicators": lambda s, many: (
+            "GET", "/stock-indicators", {"symbol": s, "source": source, "indicators": "sma:20,rsi:14,macd"}, None),
+        "stock-returns": lambda s, many: (
+            "POST", "/stock-returns", None, {"symbols": many[:10], "source": source, "benchmark": s}),
+        "stock-valuation": lambda s, many: ("GET", "/stock-valuation", {"symbol": s, "source": source}, None),
+        "search": lambda s, many: ("GET", "/search", {"q": s[:rng.randint(2, len(s))].lower(), "limit": 10}, None),
+        "stock-balance-sheet": lambda s, many: ("GET", "/stock-balance-sheet", {"symbol": s, "source": source}, None),
+        "stock-cashflow": lambda s, many: ("GET", "/stock-cashflow", {"symbol": s, "source": source}, None),
+        "stock-income": lambda s, many: ("GET", "/stock-income", {"symbol": s, "source": source}, None),
+        "stock-key-ratios": lambda s, many: ("GET", "/stock-key-ratios", {"symbol": s, "source": source}, None),
+        "stock-recommendations": lambda s, many: (
+            "GET", "/stock-recommendations", {"symbol": s, "source": source}, None),
+        "market-snapshot": lambda s, many: ("GET", "/market/snapshot", {"source": source}, None),
+        "screener": lambda s, many: (
+            "GET", "/screener", {"source": source, "filter": "price_to_earnings::50", "sort": "-return_on_equity"}, None),
+        "industries": lambda s, many: ("GET", "/industries", {"source": source}, None),
+        "industry-aggregates": lambda s, many: (
+            "GET", "/industry-aggregates", {"source": source, "industry": rng.choice(industries)}, None),
+        "sources": lambda s, many: ("GET", "/sources", None, None),
+    }
+    if not industries:
+        del table["industry-aggregates"]
+    return table
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ms = np.asarray(latencies) * 1000
+    summary = {"requests": len(latencies), "errors": errors, "throughput_rps": round(len(latencies) / elapsed, 2)}
+    if len(ms):
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        summary.update(
+            mean_ms=round(float(ms.mean()), 2), p50_ms=round(float(p50), 2),
+            p95_ms=round(float(p95), 2), p99_ms=round(float(p99), 2), max_ms=round(float(ms.max()), 2),
+        )
+    return summary
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        res = await client.get("/stocks-list", params={"limit": args.symbols})
+        res.raise_for_status()
+        symbols = res.json()
+        if not symbols:
+            raise SystemExit("No symbols returned by /stocks-list")
+
+        res = await client.get("/industries", params={"source": args.source})
+        industries = [row["industry"] for row in res.json()["data"]] if res.status_code == 200 else []
+
+        rng = random.Random(args.seed)
+        table = scenarios(args.source, industries, rng)
+        names = [n for n in table if not args.endpoints or n in args.endpoints]
+        latencies: dict[str, list[float]] = defaultdict(list)
+        errors: dict[str, int] = defaultdict(int)
+
+        async def worker(deadline: float) -> None:
+            while time.perf_counter() < deadline:
+                name = rng.choice(names)
+                method, path, params, body = table[name](rng.choice(symbols), rng.sample(symbols, min(20, len(symbols))))
+                started = time.perf_counter()
+                try:
+                    res = await client.request(method, path, params=params, json=body)
+                    await res.aread()
+                    ok = res.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[name].append(time.perf_counter() - started)
+                else:
+                    errors[name] += 1
+
+        if args.warmup:
+            await asyncio.gather(*(worker(time.perf_counter() + args.warmup) for _ in range(args.concurrency)))
+            latencies.clear()
+            errors.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + args.duration) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    every = [x for name in names for x in latencies[name]]
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "base_url": args.base_url,
+            "source": args.source,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "symbols": len(symbols),
+        },
+        "overall": summarize(every, sum(errors.values()), elapsed),
+        "endpoints": {name: summarize(latencies[name], errors[name], elapsed) for name in names},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--source", default="YFIN")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--symbols", type=int, default=200, help="number of symbols to draw from")
+    parser.add_argument("--endpoints", nargs="*", help="restrict to these scenario names")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="JSON results file (default bench/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(f"{'endpoint':<24}{'req':>8}{'err':>6}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, s in {**result["endpoints"], "overall": result["overall"]}.items():
+        print(f"{name:<24}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>10}"
+              f"{s.get('p50_ms', '-'):>9}{s.get('p95_ms', '-'):>9}{s.get('p99_ms', '-'):>9}")
+
+    output = args.output or RESULTS_DIR / f"load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
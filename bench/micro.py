@@ -0,0 +1,124 @@
+"""Serialization micro-benchmarks, no database or server needed.
+
+Rows shaped like the fact queries' results are pushed through each response
+path the API has: FastAPI's response_model pipeline (pydantic validation plus
+json.dumps), the orjson fast path, the columnar JSON body and Arrow IPC.
+
+    python -m bench.micro --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from pydantic import TypeAdapter
+from sqlalchemy import Float, Integer
+
+import facts
+import formats
+import schemas
+from bench.load import RESULTS_DIR, git_commit
+
+
+def ohlcv_rows(n: int, rng) -> list[tuple]:
+    days = np.arange(np.datetime64("1990-01-01"), np.datetime64("1990-01-01") + n)
+    date_keys = np.char.replace(days.astype(str), "-", "").astype(np.int64)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    volume = rng.lognormal(12, 1, n).astype(np.int64)
+    return [
+        (int(d), float(c * 0.99), float(c * 1.01), float(c * 0.98), float(c), int(v))
+        for d, c, v in zip(date_keys, close, volume)
+    ]
+
+
+def key_ratio_rows(n: int, rng) -> list[tuple]:
+    """Rows with a plausible value for every key-ratio column, by column type."""
+    def value(name, column):
+        if name == "date_key":
+            return lambda i: 20000101 + i
+        if isinstance(column.type, Float):
+            return lambda i: float(rng.lognormal(2, 1))
+        if isinstance(column.type, Integer):
+            return lambda i: int(rng.integers(1, 500))
+        return lambda i: f"{rng.random():.4f}"
+
+    makers = [value(name, column) for name, column in facts.KEY_RATIOS.columns.items()]
+    return [tuple(make(i) for make in makers) for i in range(n)]
+
+
+def cases(table: facts.FactTable, model, rows: list[tuple]) -> dict:
+    adapter = TypeAdapter(List[model])
+
+    def response_model():
+        # What FastAPI does with response_model: validate, dump in JSON mode, json.dumps
+        data = adapter.validate_python(table.dicts(rows))
+        return json.dumps(adapter.dump_python(data, mode="json")).encode()
+
+    def orjson_fast_path():
+        return formats.json_bytes(table.dicts(rows))
+
+    def columnar():
+        return formats.columnar_response(table, rows, {"symbol": "BENCH"}).body
+
+    def arrow():
+        return formats.arrow_response(table, rows, {"symbol": "BENCH"}).body
+
+    found = {"response_model": response_model, "orjson": orjson_fast_path, "columnar": columnar}
+    try:
+        import pyarrow  # noqa: F401
+        found["arrow"] = arrow
+    except ImportError:
+        pass
+    return found
+
+
+def measure(fn, repeat: int, n_rows: int) -> dict:
+    fn()  # warm caches such as date_key_to_datetime
+    timings, size = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    return {
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "rows_per_s": round(n_rows / median),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="JSON results file (default bench/results/micro-<timestamp>.json)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    datasets = {
+        "ohlcv": (facts.OHLCV, schemas.OhlcvOut, ohlcv_rows(args.rows, rng)),
+        "key-ratios": (facts.KEY_RATIOS, schemas.KeyRatiosOut, key_ratio_rows(args.rows, rng)),
+    }
+    results = {}
+    for dataset, (table, model, rows) in datasets.items():
+        results[dataset] = {name: measure(fn, args.repeat, len(rows)) for name, fn in cases(table, model, rows).items()}
+        for name, r in results[dataset].items():
+            print(f"{dataset:<12}{name:<16}{r['median_ms']:>10} ms{r['rows_per_s']:>12} rows/s{r['bytes']:>12} B")
+
+    output = args.output or RESULTS_DIR / f"micro-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "meta": {"commit": git_commit(), "rows": args.rows, "repeat": args.repeat},
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
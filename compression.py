@@ -0,0 +1,157 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Everything the API produces compresses well; other types are passed through untouched
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.columnar+json",
+    "application/vnd.apache.arrow.stream",
+    "text/",
+)
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _Brotli:
+    def __init__(self, level: int):
+        self._c = brotli.Compressor(quality=level)
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        out = self._c.process(data)
+        return out + (self._c.finish() if final else self._c.flush())
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data: bytes, final: bool) -> bytes:
+        mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        return self._c.compress(data) + self._c.flush(mode)
+
+
+CODECS = {"gzip": _Gzip}
+if brotli is not None:
+    CODECS["br"] = _Brotli
+if zstandard is not None:
+    CODECS["zstd"] = _Zstd
+
+
+def negotiate_encoding(accept_encoding: str, preference: list[str]) -> Optional[str]:
+    """Pick the client's highest-q encoding, breaking ties by server `preference`."""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in preference:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """Pure ASGI response compression negotiated from Accept-Encoding.
+
+    Each body chunk is compressed and flushed as it is sent, so streamed exports
+    stay streamed and memory doesn't grow with the response. Single-chunk bodies
+    under `min_size` are sent as-is. So are 304s, already-encoded responses,
+    `Cache-Control: no-transform` and non-compressible media types.
+    """
+
+    def __init__(self, app, encodings: list[str], levels: dict[str, int], min_size: int):
+        self.app = app
+        self.encodings = [e for e in encodings if e in CODECS]
+        self.levels = levels
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # With no acceptable encoding the sender still adds Vary: Accept-Encoding
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        sender = _CompressingSender(send, encoding, self.levels.get(encoding), self.min_size)
+        await self.app(scope, receive, sender)
+        if sender.start is not None and sender.codec is None and not sender.passthrough:
+            # The app finished without sending a body
+            await send(sender.start)
+
+
+class _CompressingSender:
+    def __init__(self, send, encoding: Optional[str], level: Optional[int], min_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.min_size = min_size
+        self.start = None
+        self.codec = None
+        self.passthrough = False
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+            return False
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether compression pays off
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.codec is None:
+            headers = MutableHeaders(scope=self.start)
+            if not self._compressible(headers):
+                self.passthrough = True
+            else:
+                headers.add_vary_header("Accept-Encoding")
+                if self.encoding is None or (not more_body and len(body) < self.min_size):
+                    self.passthrough = True
+            if self.passthrough:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+            self.codec = CODECS[self.encoding](self.level)
+            await self.send(self.start)
+
+        await self.send({
+            "type": "http.response.body",
+            "body": self.codec.chunk(body, final=not more_body),
+            "more_body": more_body,
+        })
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import select, func, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings, replica_set
+from facts import FactTable
+from singleflight import SingleFlight
+
+
+async def latest_load_ts(db: AsyncSession, model, stock_key: int, source_key: int) -> Optional[datetime]:
+    """max(load_ts) of one stock/source slice of a fact table."""
+    res = await db.execute(
+        select(func.max(model.load_ts)).where(model.stock_key == stock_key, model.source_key == source_key)
+    )
+    return res.scalar_one_or_none()
+
+
+async def basket_load_ts(db: AsyncSession, model, stock_keys: list[int], source_key: int) -> Optional[datetime]:
+    """max(load_ts) over several stocks' slices of a fact table, in one statement."""
+    res = await db.execute(
+        select(func.max(model.load_ts)).where(
+            model.stock_key == any_(bindparam("stock_keys", stock_keys, type_=ARRAY(BigInteger))),
+            model.source_key == source_key,
+        )
+    )
+    return res.scalar_one_or_none()
+
+
+class Validators:
+    """ETag / Last-Modified for one fact response.
+
+    The warehouse only changes in load batches, so the latest load_ts of the
+    stock/source slice plus the request parameters fully determine the body.
+    """
+
+    def __init__(self, etag: str, last_modified: Optional[datetime]):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def headers(self) -> dict[str, str]:
+        # The representation also depends on Accept (json/columnar/arrow negotiation)
+        headers = {"ETag": self.etag, "Vary": "Accept"}
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        if settings.fact_cache_control:
+            headers["Cache-Control"] = settings.fact_cache_control
+        return headers
+
+    def not_modified(self, request: Request) -> bool:
+        """Evaluate If-None-Match, falling back to If-Modified-Since (RFC 7232 order)."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {t.strip() for t in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags or self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates have second precision
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def not_modified_response(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+
+load_ts_flight = SingleFlight(settings.coalesce_ttl_seconds, settings.coalesce_cache_size)
+
+
+async def shared_load_ts(model, stock_key: int, source_key: int) -> Optional[datetime]:
+    """latest_load_ts with concurrent identical lookups coalesced onto one query on a session of its own."""
+    async def fetch():
+        async with replica_set.session() as db:
+            return await latest_load_ts(db, model, stock_key, source_key)
+
+    return await load_ts_flight.do((model.__tablename__, stock_key, source_key), fetch)
+
+
+async def fact_validators(
+    table: FactTable, stock_key: int, source_key: int, request: Request, fmt: str,
+    also: tuple[FactTable, ...] = (),
+) -> Validators:
+    """Build validators from the slice's latest load_ts, the query string and the negotiated format.
+
+    Responses derived from several fact tables pass the others in `also`; a load
+    into any of them changes the ETag, and Last-Modified is the latest of them.
+    """
+    stamps = []
+    for t in (table, *also):
+        load_ts = await shared_load_ts(t.model, stock_key, source_key)
+        if load_ts is not None and load_ts.tzinfo is None:
+            # load_ts is stored without a zone; the loaders write UTC
+            load_ts = load_ts.replace(tzinfo=timezone.utc)
+        stamps.append(load_ts)
+    key = "|".join((
+        table.name,
+        str(stock_key),
+        str(source_key),
+        *(ts.isoformat() if ts else "" for ts in stamps),
+        fmt,
+        str(sorted(request.query_params.multi_items())),
+    ))
+    etag = 'W/"%s"' % hashlib.sha1(key.encode()).hexdigest()[:32]
+    return Validators(etag, max((ts for ts in stamps if ts), default=None))
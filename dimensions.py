@@ -0,0 +1,152 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings
+import models
+
+
+@dataclass(frozen=True)
+class StockEntry:
+    stock_key: int
+    nk_symbol: str
+    company_name: Optional[str]
+    industry: Optional[str]
+    series: Optional[str]
+    isin_code: Optional[str]
+    yfin_symbol: Optional[str]
+
+
+class DimensionCache:
+    """Process-wide copy of dim_stock and dim_source.
+
+    Symbols and source names are resolved case-insensitively from dicts instead of
+    an ILIKE round trip per request. The cache remembers the max(load_ts) of both
+    dimension tables and reloads itself when it changes; the check is a single
+    cheap query that runs at most once per `refresh_interval` seconds, and again
+    on a lookup miss so newly loaded symbols are picked up immediately. Misses
+    recheck at most once per `miss_refresh_interval` seconds, so a flood of
+    unknown symbols neither queues on the lock nor hits the DB per request.
+    """
+
+    def __init__(self, refresh_interval: float, miss_refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.miss_refresh_interval = miss_refresh_interval
+        self._stocks: dict[str, StockEntry] = {}
+        self._stocks_by_key: dict[int, StockEntry] = {}
+        self._sources: dict[str, int] = {}
+        self._source_names: dict[int, str] = {}
+        self._version: Optional[tuple] = None
+        self._reloads = 0
+        self._checked_at = 0.0
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> Optional[tuple]:
+        """(max dim_stock.load_ts, max dim_source.load_ts) of the loaded snapshot."""
+        return self._version
+
+    @property
+    def reloads(self) -> int:
+        """Number of snapshots loaded so far, including reloads that found the same load_ts."""
+        return self._reloads
+
+    def stocks(self) -> list[StockEntry]:
+        return list(self._stocks_by_key.values())
+
+    def stock_by_key(self, stock_key: int) -> Optional[StockEntry]:
+        return self._stocks_by_key.get(stock_key)
+
+    def source_name(self, source_key: int) -> Optional[str]:
+        return self._source_names.get(source_key)
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next lookup."""
+        self._loaded = False
+
+    async def _current_version(self, db: AsyncSession) -> tuple:
+        stmt = select(
+            select(func.max(models.DimStock.load_ts)).scalar_subquery(),
+            select(func.max(models.DimSource.load_ts)).scalar_subquery(),
+        )
+        res = await db.execute(stmt)
+        return tuple(res.one())
+
+    async def _load(self, db: AsyncSession, version: tuple) -> None:
+        res = await db.execute(select(
+            models.DimStock.stock_key,
+            models.DimStock.nk_symbol,
+            models.DimStock.company_name,
+            models.DimStock.industry,
+            models.DimStock.series,
+            models.DimStock.isin_code,
+            models.DimStock.yfin_symbol,
+        ))
+        stocks = [StockEntry(*row) for row in res.all()]
+        res = await db.execute(select(models.DimSource.source_key, models.DimSource.source_name))
+        sources = res.all()
+
+        # Swap whole dicts so concurrent readers never see a half-built cache
+        self._stocks = {s.nk_symbol.strip().lower(): s for s in stocks}
+        self._stocks_by_key = {s.stock_key: s for s in stocks}
+        self._sources = {name.strip().lower(): key for key, name in sources}
+        self._source_names = {key: name for key, name in sources}
+        self._version = version
+        self._reloads += 1
+        self._loaded = True
+
+    async def ensure_fresh(self, db: AsyncSession, force: bool = False) -> None:
+        """Reload the dimensions if they were never loaded or load_ts moved.
+
+        `force` is for lookup misses: it checks load_ts unless that was done in the
+        last `miss_refresh_interval` seconds. invalidate() always forces a reload.
+        """
+        interval = self.miss_refresh_interval if force else self.refresh_interval
+        if self._loaded and time.monotonic() - self._checked_at < interval:
+            return
+        async with self._lock:
+            checked_at = time.monotonic()
+            # Another request may have refreshed while we were waiting for the lock
+            if self._loaded and checked_at - self._checked_at < interval:
+                return
+            version = await self._current_version(db)
+            if not self._loaded or version != self._version:
+                await self._load(db, version)
+            self._checked_at = checked_at
+
+    async def get_stock(self, db: AsyncSession, symbol: str) -> Optional[StockEntry]:
+        await self.ensure_fresh(db)
+        key = symbol.strip().lower()
+        entry = self._stocks.get(key)
+        if entry is None:
+            await self.ensure_fresh(db, force=True)
+            entry = self._stocks.get(key)
+        return entry
+
+    async def get_stocks(self, db: AsyncSession, symbols: list[str]) -> dict[str, StockEntry]:
+        """Resolve many symbols at once; missing symbols are left out of the result.
+
+        At most one forced refresh is made no matter how many symbols miss.
+        """
+        await self.ensure_fresh(db)
+        keys = {symbol: symbol.strip().lower() for symbol in symbols}
+        if any(key not in self._stocks for key in keys.values()):
+            await self.ensure_fresh(db, force=True)
+        return {symbol: self._stocks[key] for symbol, key in keys.items() if key in self._stocks}
+
+    async def get_source_key(self, db: AsyncSession, source: str) -> Optional[int]:
+        await self.ensure_fresh(db)
+        key = source.strip().lower()
+        source_key = self._sources.get(key)
+        if source_key is None:
+            await self.ensure_fresh(db, force=True)
+            source_key = self._sources.get(key)
+        return source_key
+
+
+dimension_cache = DimensionCache(settings.dim_cache_refresh_seconds, settings.dim_cache_miss_refresh_seconds)
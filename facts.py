@@ -0,0 +1,351 @@
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Optional
+
+from sqlalchemy import select, Select, BigInteger, Text, cast, func, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.orm import InstrumentedAttribute
+
+import models
+
+# Label of the surrogate key that query() appends after the output fields
+ROW_KEY = "_row_key"
+
+
+@lru_cache(maxsize=65536)
+def date_key_to_datetime(date_key: int) -> datetime:
+    """Convert a YYYYMMDD date_key to a datetime without going through strptime."""
+    return datetime(date_key // 10000, date_key // 100 % 100, date_key % 100)
+
+
+@dataclass(frozen=True)
+class FactTable:
+    """How one fact table is exposed by the API.
+
+    `columns` maps output field names to model columns in response order;
+    `converters` post-process a field's raw DB value (e.g. date_key -> datetime).
+    A stock/source slice may hold several rows per date_key, so range queries
+    order by (date_key, `row_key`), the table's surrogate key, and page cursors
+    hold both.
+    """
+    name: str
+    model: Any
+    columns: dict[str, InstrumentedAttribute]
+    row_key: InstrumentedAttribute
+    date_field: str = "date_key"
+    descending: bool = True
+    converters: dict[str, Callable[[Any], Any]] = field(default_factory=dict)
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.columns)
+
+    def select(self, columns: Optional[dict] = None) -> Select:
+        """Select the output columns, labelled with their output names.
+
+        `columns` substitutes SQL expressions for some or all output fields
+        (e.g. split-adjusted prices), keyed the same way as `self.columns`.
+        """
+        columns = columns or {}
+        return select(*(columns.get(name, col).label(name) for name, col in self.columns.items()))
+
+    def query(
+        self,
+        stock_key: int,
+        source_key: int,
+        start_date: Optional[int] = None,
+        end_date: Optional[int] = None,
+        descending: Optional[bool] = None,
+        after: Optional[tuple[int, int]] = None,
+        columns: Optional[dict] = None,
+    ) -> Select:
+        """Build the range query for one stock/source, ordered by (date_key, row_key).
+
+        Rows carry the row key after the output fields, labelled ROW_KEY. `after`
+        is the (date_key, row_key) of the last row of the previous page; the query
+        seeks past it rather than using OFFSET.
+        """
+        model = self.model
+        stmt = (
+            self.select(columns)
+            .add_columns(self.row_key.label(ROW_KEY))
+            .where(model.stock_key == stock_key, model.source_key == source_key)
+        )
+        if start_date:
+            stmt = stmt.where(model.date_key >= start_date)
+        if end_date:
+            stmt = stmt.where(model.date_key <= end_date)
+        descending = self.descending if descending is None else descending
+        if after is not None:
+            position = tuple_(model.date_key, self.row_key)
+            stmt = stmt.where(position < tuple_(*after) if descending else position > tuple_(*after))
+        if descending:
+            return stmt.order_by(model.date_key.desc(), self.row_key.desc())
+        return stmt.order_by(model.date_key, self.row_key)
+
+    def project(self, fields: Optional[list[str]]) -> "FactTable":
+        """This table narrowed to `fields`, in response order; the date field is always kept.
+
+        Raises ValueError listing names that aren't output fields. No fields means the full table.
+        """
+        if not fields:
+            return self
+        unknown = [name for name in fields if name not in self.columns]
+        if unknown:
+            raise ValueError(", ".join(unknown))
+        keep = {self.date_field, *fields}
+        return replace(
+            self,
+            columns={name: col for name, col in self.columns.items() if name in keep},
+            converters={name: conv for name, conv in self.converters.items() if name in keep},
+        )
+
+    def dicts(self, rows) -> list[dict]:
+        """Rows selected with `select()`/`query()` as output dicts."""
+        names = self.fields
+        if not self.converters:
+            return [dict(zip(names, row)) for row in rows]
+        return [dict(zip(names, self.convert_row(row))) for row in rows]
+
+    def date_key_of(self, row) -> int:
+        """Raw date_key of a row selected with `select()`/`query()`, or a plain tuple in field order."""
+        return row[self.fields.index(self.date_field)]
+
+    def position_of(self, row) -> tuple[int, int]:
+        """(date_key, row_key) of a row selected with `query()`, for keyset cursors."""
+        return row[self.fields.index(self.date_field)], row[len(self.columns)]
+
+    def convert_row(self, row) -> tuple:
+        """Apply converters to one result row, keeping field order and dropping the row key."""
+        if not self.converters:
+            return tuple(row[:len(self.columns)])
+        return tuple(
+            self.converters[name](value) if name in self.converters and value is not None else value
+            for name, value in zip(self.columns, row)
+        )
+
+
+OHLCV = FactTable(
+    name="ohlcv",
+    model=models.FactOhlcv,
+    row_key=models.FactOhlcv.ohlcv_key,
+    columns={
+        "traded_date": models.FactOhlcv.date_key,
+        "open_price": models.FactOhlcv.open_price,
+        "high_price": models.FactOhlcv.high_price,
+        "low_price": models.FactOhlcv.low_price,
+        "close_price": models.FactOhlcv.close_price,
+        "volume": models.FactOhlcv.volume,
+    },
+    date_field="traded_date",
+    descending=False,
+    converters={"traded_date": date_key_to_datetime},
+)
+
+
+
+def next_bucket_start(date_key: int, interval: str) -> int:
+    """date_key of the first day of the bucket after the one containing `date_key`.
+
+    Buckets follow Postgres date_trunc: ISO weeks start on Monday.
+    """
+    day = date_key_to_datetime(date_key).date()
+    if interval == "week":
+        start = day - timedelta(days=day.weekday()) + timedelta(days=7)
+    else:
+        months = 3 if interval == "quarter" else 1
+        month0 = (day.month - 1) // months * months + months
+        start = date(day.year + month0 // 12, month0 % 12 + 1, 1)
+    return start.year * 10000 + start.month * 100 + start.day
+
+
+def resampled_ohlcv_query(
+    stock_key: int,
+    source_key: int,
+    interval: str,
+    start_date: Optional[int] = None,
+    end_date: Optional[int] = None,
+    after: Optional[int] = None,
+    columns: Optional[dict] = None,
+    fields: Optional[list[str]] = None,
+) -> Select:
+    """OHLCV bars per week/month/quarter, aggregated in SQL.
+
+    Columns carry the same labels as OHLCV.select(): traded_date is the first
+    date_key in the bucket, open/close the first/last prices by date_key, high/low
+    the extremes and volume the sum. `after` is a raw date_key lower bound.
+    `columns` optionally replaces the daily price/volume expressions being aggregated;
+    `fields` limits the select to those output fields (see FactTable.project).
+    """
+    m = models.FactOhlcv
+    c = columns or OHLCV.columns
+    bucket = func.date_trunc(interval, func.to_date(cast(m.date_key, Text), "YYYYMMDD"))
+    bars = {
+        "traded_date": func.min(m.date_key),
+        "open_price": array_agg(aggregate_order_by(c["open_price"], m.date_key))[1],
+        "high_price": func.max(c["high_price"]),
+        "low_price": func.min(c["low_price"]),
+        "close_price": array_agg(aggregate_order_by(c["close_price"], m.date_key.desc()))[1],
+        "volume": cast(func.sum(c["volume"]), BigInteger),
+    }
+    stmt = select(
+        *(expr.label(name) for name, expr in bars.items() if fields is None or name in fields)
+    ).where(m.stock_key == stock_key, m.source_key == source_key)
+    if start_date:
+        stmt = stmt.where(m.date_key >= start_date)
+    if end_date:
+        stmt = stmt.where(m.date_key <= end_date)
+    if after is not None:
+        stmt = stmt.where(m.date_key >= after)
+    return stmt.group_by(bucket).order_by(bucket)
+
+
+BALANCE_SHEET = FactTable(
+    name="balance-sheet",
+    model=models.FactBalanceSheet,
+    row_key=models.FactBalanceSheet.balance_sheet_key,
+    columns={
+        "date_key": models.FactBalanceSheet.date_key,
+        "reporting_period": models.FactBalanceSheet.reporting_period,
+        "cash_and_short_term_investments": models.FactBalanceSheet.bal_csti,
+        "total_receivables": models.FactBalanceSheet.bal_trec,
+        "total_inventory": models.FactBalanceSheet.bal_tinv,
+        "other_current_assets": models.FactBalanceSheet.bal_oca,
+        "total_current_assets": models.FactBalanceSheet.bal_tca,
+        "net_loans": models.FactBalanceSheet.bal_netl,
+        "net_property_plant_and_equipment": models.FactBalanceSheet.bal_nppe,
+        "goodwill_and_intangibles": models.FactBalanceSheet.bal_gint,
+        "long_term_investments": models.FactBalanceSheet.bal_lti,
+        "other_assets": models.FactBalanceSheet.bal_otha,
+        "total_assets": models.FactBalanceSheet.bal_tota,
+        "accounts_payable": models.FactBalanceSheet.bal_accp,
+        "total_deposits": models.FactBalanceSheet.bal_tdep,
+        "other_current_liabilities": models.FactBalanceSheet.bal_ocl,
+        "total_current_liabilities": models.FactBalanceSheet.bal_tcl,
+        "total_long_term_debt": models.FactBalanceSheet.bal_tltd,
+        "total_debt": models.FactBalanceSheet.bal_tdeb,
+        "deferred_income_taxes": models.FactBalanceSheet.bal_dit,
+        "minority_interest": models.FactBalanceSheet.bal_mint,
+        "other_liabilities": models.FactBalanceSheet.bal_othl,
+        "total_liabilities": models.FactBalanceSheet.bal_totl,
+        "common_stock": models.FactBalanceSheet.bal_coms,
+        "additional_paid_in_capital": models.FactBalanceSheet.bal_apic,
+        "retained_earnings": models.FactBalanceSheet.bal_rtne,
+        "other_equity": models.FactBalanceSheet.bal_oeq,
+        "total_equity": models.FactBalanceSheet.bal_teq,
+        "total_liabilities_and_shareholders_equity": models.FactBalanceSheet.bal_tlse,
+        "total_common_shares_outstanding": models.FactBalanceSheet.bal_tcso,
+        "total_preferred_shares_outstanding": models.FactBalanceSheet.bal_tpso,
+        "net_current_assets": models.FactBalanceSheet.bal_nca,
+        "current_assets": models.FactBalanceSheet.bal_ca,
+        "net_current_liabilities": models.FactBalanceSheet.bal_ncl,
+        "deferred_tax_assets": models.FactBalanceSheet.bal_dta,
+    },
+)
+
+CASHFLOW = FactTable(
+    name="cashflow",
+    model=models.FactCashflow,
+    row_key=models.FactCashflow.cashflow_key,
+    columns={
+        "date_key": models.FactCashflow.date_key,
+        "reporting_period": models.FactCashflow.reporting_period,
+        "change_in_working_capital": models.FactCashflow.caf_ciwc,
+        "cash_flow_from_operating_activities": models.FactCashflow.caf_cfoa,
+        "capital_expenditures": models.FactCashflow.caf_cexp,
+        "cash_flow_from_investing_activities": models.FactCashflow.caf_cfia,
+        "total_cash_dividends_paid": models.FactCashflow.caf_tcdp,
+        "cash_flow_from_financing_activities": models.FactCashflow.caf_cffa,
+        "fee_or_expense_explanation": models.FactCashflow.caf_fee,
+        "net_change_in_cash_and_cash_equivalents": models.FactCashflow.caf_ncic,
+        "free_cash_flow": models.FactCashflow.caf_fcf,
+    },
+)
+
+INCOME = FactTable(
+    name="income",
+    model=models.FactIncome,
+    row_key=models.FactIncome.income_key,
+    columns={
+        "date_key": models.FactIncome.date_key,
+        "reporting_period": models.FactIncome.reporting_period,
+        "total_revenue": models.FactIncome.q_inc_trev,
+        "raw_material_costs": models.FactIncome.q_inc_raw,
+        "profit_from_core": models.FactIncome.q_inc_pfc,
+        "earnings_per_core": models.FactIncome.q_inc_epc,
+        "selling_general_admin_expenses": models.FactIncome.q_inc_sga,
+        "operating_expenses": models.FactIncome.q_inc_ope,
+        "earnings_before_interest": models.FactIncome.q_inc_ebi,
+        "depreciation": models.FactIncome.q_inc_dep,
+        "profit_before_interest": models.FactIncome.q_inc_pbi,
+        "income_from_other_investments": models.FactIncome.q_inc_ioi,
+        "profit_before_tax": models.FactIncome.q_inc_pbt,
+        "total_operating_income": models.FactIncome.q_inc_toi,
+        "net_income": models.FactIncome.q_inc_ninc,
+        "earnings_per_share": models.FactIncome.q_inc_eps,
+        "dividends_per_share": models.FactIncome.q_inc_dps,
+        "payout_ratio": models.FactIncome.q_inc_pyr,
+    },
+)
+
+KEY_RATIOS = FactTable(
+    name="key-ratios",
+    model=models.FactKeyRatios,
+    row_key=models.FactKeyRatios.key_ratios_key,
+    columns={
+        "date_key": models.FactKeyRatios.date_key,
+        "risk": models.FactKeyRatios.risk,
+        "three_month_average_volume": models.FactKeyRatios.letter_3mavgvol,
+        "four_week_price_change_pct": models.FactKeyRatios.letter_4wpct,
+        "fifty_two_week_high": models.FactKeyRatios.letter_52whigh,
+        "fifty_two_week_low": models.FactKeyRatios.letter_52wlow,
+        "fifty_two_week_price_change_pct": models.FactKeyRatios.letter_52wpct,
+        "beta": models.FactKeyRatios.beta,
+        "book_value_per_share": models.FactKeyRatios.bps,
+        "dividend_yield": models.FactKeyRatios.div_yield,
+        "earnings_per_share": models.FactKeyRatios.eps,
+        "industry_dividend_yield": models.FactKeyRatios.inddy,
+        "industry_price_to_book": models.FactKeyRatios.indpb,
+        "industry_price_to_earnings": models.FactKeyRatios.indpe,
+        "market_cap": models.FactKeyRatios.market_cap,
+        "market_cap_rank": models.FactKeyRatios.mrkt_cap_rank,
+        "price_to_book": models.FactKeyRatios.pb,
+        "price_to_earnings": models.FactKeyRatios.pe,
+        "return_on_equity": models.FactKeyRatios.roe,
+        "number_of_shareholders": models.FactKeyRatios.n_shareholders,
+        "last_traded_price": models.FactKeyRatios.last_price,
+        "trailing_twelve_month_pe": models.FactKeyRatios.ttm_pe,
+        "market_cap_label": models.FactKeyRatios.market_cap_label,
+        "twelve_month_volume": models.FactKeyRatios.letter_12mvol,
+        "market_cap_float": models.FactKeyRatios.mrkt_capf,
+        "adjusted_pe_forward": models.FactKeyRatios.apef,
+        "price_to_book_redundant": models.FactKeyRatios.pbr,
+        "etf_liquidity": models.FactKeyRatios.etf_liq,
+        "etf_liquidity_label": models.FactKeyRatios.etf_liq_label,
+        "expense_ratio": models.FactKeyRatios.expense_ratio,
+        "tracking_error": models.FactKeyRatios.track_err,
+        "industry_expense_ratio": models.FactKeyRatios.ind_expense_ratio,
+        "industry_tracking_error": models.FactKeyRatios.ind_track_err,
+        "assets_under_management": models.FactKeyRatios.asst_under_man,
+    },
+)
+
+RECOMMENDATIONS = FactTable(
+    name="recommendations",
+    model=models.FactRecommendations,
+    row_key=models.FactRecommendations.recommendation_key,
+    columns={
+        "date_key": models.FactRecommendations.date_key,
+        "recommendation_period": models.FactRecommendations.recommendation_period,
+        "strong_buy": models.FactRecommendations.strong_buy,
+        "buy": models.FactRecommendations.buy,
+        "hold": models.FactRecommendations.hold,
+        "sell": models.FactRecommendations.sell,
+        "strong_sell": models.FactRecommendations.strong_sell,
+    },
+)
+
+FACT_TABLES: dict[str, FactTable] = {
+    t.name: t for t in (OHLCV, BALANCE_SHEET, CASHFLOW, INCOME, KEY_RATIOS, RECOMMENDATIONS)
+}
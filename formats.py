@@ -0,0 +1,129 @@
+import csv
+import io
+import time
+from datetime import date, datetime
+from typing import AsyncIterator
+
+import orjson
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, Float, Integer
+from sqlalchemy.ext.asyncio import AsyncResult
+
+from facts import FactTable
+from metrics import record_serialize
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_bytes(value) -> bytes:
+    """Compact JSON encoding that understands the datetimes the fact tables return."""
+    started = time.perf_counter()
+    body = orjson.dumps(value, default=_json_default)
+    record_serialize(time.perf_counter() - started)
+    return body
+
+
+async def ndjson_chunks(table: FactTable, result: AsyncResult) -> AsyncIterator[bytes]:
+    """Encode a streamed result as newline-delimited JSON, one chunk per fetched partition."""
+    names = table.fields
+    async for rows in result.partitions():
+        yield b"".join(json_bytes(dict(zip(names, table.convert_row(r)))) + b"\n" for r in rows)
+
+
+async def csv_chunks(table: FactTable, result: AsyncResult) -> AsyncIterator[bytes]:
+    """Encode a streamed result as CSV with a header row, one chunk per fetched partition."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(table.fields)
+    async for rows in result.partitions():
+        writer.writerows(table.convert_row(r) for r in rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        # Header of an empty export
+        yield buf.getvalue().encode()
+
+
+STREAM_ENCODERS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "csv": (csv_chunks, "text/csv"),
+}
+
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+COLUMNAR_MEDIA_TYPE = "application/vnd.columnar+json"
+
+
+def negotiate_format(format: str | None, accept: str | None) -> str:
+    """Pick json, columnar or arrow from an explicit `format=` or the Accept header."""
+    if format:
+        return format
+    if accept:
+        if ARROW_MEDIA_TYPE in accept:
+            return "arrow"
+        if COLUMNAR_MEDIA_TYPE in accept:
+            return "columnar"
+    return "json"
+
+
+def _columns(table: FactTable, rows) -> dict[str, list]:
+    """Transpose DB rows into one list per output field."""
+    names = table.fields
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*(table.convert_row(r) for r in rows)))}
+
+
+def columnar_response(table: FactTable, rows, meta: dict) -> Response:
+    """JSON body with one array per field instead of one object per row."""
+    body = dict(meta, columns=_columns(table, rows))
+    return Response(json_bytes(body), media_type=COLUMNAR_MEDIA_TYPE)
+
+
+def arrow_type(pa, table: FactTable, name: str, raw: bool = False):
+    """Arrow type of an output field; `raw` keeps converted fields (date_key) as stored."""
+    if name in table.converters and not raw:
+        # date_key is surfaced as a timestamp, same as the JSON output
+        return pa.timestamp("s")
+    column_type = table.columns[name].type
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Integer):
+        # Integer, BigInteger and SmallInteger all subclass Integer
+        return pa.int64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def arrow_response(table: FactTable, rows, meta: dict) -> Response:
+    """Arrow IPC stream built directly from the DB rows."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail="Arrow output is not available on this server")
+
+    schema = pa.schema(
+        [(name, arrow_type(pa, table, name)) for name in table.fields],
+        metadata={k: str(v) for k, v in meta.items()},
+    )
+    started = time.perf_counter()
+    columns = _columns(table, rows)
+    batch = pa.record_batch([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch)
+    body = sink.getvalue().to_pybytes()
+    record_serialize(time.perf_counter() - started)
+    return Response(body, media_type=ARROW_MEDIA_TYPE)
+
+
+def tabular_response(fmt: str, table: FactTable, rows, meta: dict) -> Response:
+    if fmt == "arrow":
+        return arrow_response(table, rows, meta)
+    return columnar_response(table, rows, meta)
@@ -0,0 +1,439 @@
+"""On-disk cache of closed fact history, with build/verify/prune commands.
+
+Each stock/source slice of a fact table is written as Arrow IPC files, one per
+year, under DISK_CACHE_DIR/<table>/<source_key>/<stock_key>/, next to a
+manifest.json holding `through`: the last date_key the slice covers. The range
+endpoints memory-map those files for dates up to `through` and query Postgres
+only for the open tail after it.
+
+    python -m history_cache build [--tables ohlcv,income] [--symbols RELIANCE,TCS] [--closed-days 30]
+    python -m history_cache verify [--files-only]
+    python -m history_cache prune [--stale] [--dry-run]
+
+Rows dated within --closed-days of today are left to Postgres, as are slices
+that have not been built. Re-run build to move `through` forward; verify
+reports slices whose files or row counts and load_ts no longer match.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import shutil
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings, HeavySessionLocal
+from facts import FACT_TABLES, ROW_KEY, FactTable
+from formats import arrow_type
+from memo import BoundedCache
+import models
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+# Bumped when the file layout changes; slices of another format are read from Postgres until rebuilt
+FORMAT = 2
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def closed_through(closed_days: int, today: Optional[date] = None) -> int:
+    """date_key of the last day considered closed."""
+    day = (today or date.today()) - timedelta(days=closed_days)
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+class HistoryCache:
+    """Memory-mapped Arrow files of closed fact history, one directory per stock/source slice.
+
+    Manifests are re-read when their mtime changes, so a rebuild is picked up
+    without a restart; opened year files are kept in a bounded LRU keyed by
+    path and checksum. Any read error falls back to Postgres.
+    """
+
+    def __init__(self, root: Optional[str], open_files: int):
+        self.root = Path(root) if root else None
+        self._manifests = BoundedCache(open_files)
+        self._files = BoundedCache(open_files)
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None and pa is not None
+
+    def _dir(self, table: FactTable, source_key: int, stock_key: int) -> Path:
+        return self.root / table.name / str(source_key) / str(stock_key)
+
+    def manifest(self, table: FactTable, source_key: int, stock_key: int) -> Optional[dict]:
+        path = self._dir(table, source_key, stock_key) / MANIFEST
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        hit = self._manifests.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        manifest = json.loads(path.read_bytes())
+        self._manifests.set(path, (mtime, manifest))
+        return manifest
+
+    def _year(self, directory: Path, year: int, entry: dict):
+        path = directory / f"{year}.arrow"
+        key = (path, entry["sha256"])
+        data = self._files.get(key)
+        if data is None:
+            data = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+            self._files.set(key, data)
+        return data
+
+    def read(
+        self, table: FactTable, source_key: int, stock_key: int, manifest: dict,
+        lo: Optional[int], hi: Optional[int], descending: bool, n: int,
+        after: Optional[tuple[int, int]] = None,
+    ) -> list[tuple]:
+        """Up to `n` cached rows with lo <= date_key <= hi (None is unbounded) past the
+        (date_key, row_key) position `after`, in page order.
+
+        Rows hold `table.fields` followed by the row key, like FactTable.query().
+        """
+        directory = self._dir(table, source_key, stock_key)
+        years = sorted(int(y) for y in manifest["years"])
+        years = [y for y in years if (lo is None or y >= lo // 10000) and (hi is None or y <= hi // 10000)]
+        if descending:
+            years.reverse()
+        rows = []
+        for year in years:
+            data = self._year(directory, year, manifest["years"][str(year)])
+            dates = data.column(table.date_field).to_numpy()
+            start = int(np.searchsorted(dates, lo, side="left")) if lo is not None else 0
+            stop = int(np.searchsorted(dates, hi, side="right")) if hi is not None else len(dates)
+            if after is not None:
+                # Files are sorted by (date_key, row_key); seek within after's date
+                first = int(np.searchsorted(dates, after[0], side="left"))
+                last = int(np.searchsorted(dates, after[0], side="right"))
+                keys = data.column(ROW_KEY).to_numpy()[first:last]
+                if descending:
+                    stop = min(stop, first + int(np.searchsorted(keys, after[1], side="left")))
+                else:
+                    start = max(start, first + int(np.searchsorted(keys, after[1], side="right")))
+            if descending:
+                start = max(start, stop - (n - len(rows)))
+            else:
+                stop = min(stop, start + (n - len(rows)))
+            if stop <= start:
+                continue
+            # Files hold every field; a projected table reads only its own columns
+            part = data.slice(start, stop - start).select([*table.fields, ROW_KEY])
+            chunk = list(zip(*(column.to_pylist() for column in part.columns)))
+            rows.extend(reversed(chunk) if descending else chunk)
+            if len(rows) >= n:
+                break
+        return rows
+
+    async def page(
+        self, db: AsyncSession, table: FactTable, stock_key: int, source_key: int,
+        start_date: Optional[int], end_date: Optional[int], after: Optional[tuple[int, int]], n: int,
+    ) -> Optional[list]:
+        """The first `n` rows of a range page: history up to `through` from disk, the tail
+        from Postgres. None when the slice isn't cached, so the caller queries Postgres.
+        """
+        if not self.enabled:
+            return None
+        try:
+            manifest = self.manifest(table, source_key, stock_key)
+        except (OSError, ValueError):
+            logger.warning("Unreadable history cache manifest for %s %s/%s", table.name, source_key, stock_key)
+            return None
+        if manifest is None or manifest.get("format") != FORMAT:
+            return None
+
+        through = manifest["through"]
+        tail_start = max(start_date or 0, through + 1)
+        lo, hi = start_date, min(end_date, through) if end_date else through
+        want_tail = end_date is None or end_date > through
+
+        async def tail(limit: int) -> list:
+            stmt = table.query(stock_key, source_key, tail_start, end_date, after=after)
+            return list((await db.execute(stmt.limit(limit))).all())
+
+        try:
+            if table.descending:
+                if after is not None:
+                    hi = min(hi, after[0])
+                    want_tail = want_tail and after[0] >= tail_start
+                rows = await tail(n) if want_tail else []
+                if len(rows) < n and (lo is None or lo <= hi):
+                    rows += self.read(table, source_key, stock_key, manifest, lo, hi, True, n - len(rows), after)
+            else:
+                if after is not None:
+                    lo = max(lo or 0, after[0])
+                rows = self.read(table, source_key, stock_key, manifest, lo, hi, False, n, after) if (lo or 0) <= hi else []
+                if len(rows) < n and want_tail:
+                    rows += await tail(n - len(rows))
+        except (OSError, KeyError, pa.ArrowException):
+            logger.warning("History cache read failed for %s %s/%s", table.name, source_key, stock_key, exc_info=True)
+            return None
+        return rows
+
+    # Management
+
+    def _write_slice(
+        self, table: FactTable, source_key: int, stock_key: int, through: int, rows: list, load_ts,
+    ) -> None:
+        directory = self._dir(table, source_key, stock_key)
+        directory.mkdir(parents=True, exist_ok=True)
+        schema = pa.schema(
+            [(name, arrow_type(pa, table, name, raw=True)) for name in table.fields] + [(ROW_KEY, pa.int64())]
+        )
+        date_index = table.fields.index(table.date_field)
+        years = {}
+        for year, group in itertools.groupby(rows, key=lambda r: r[date_index] // 10000):
+            group = list(group)
+            columns = list(zip(*group))
+            batch = pa.record_batch([pa.array(columns[i], type=f.type) for i, f in enumerate(schema)], schema=schema)
+            path = directory / f"{year}.arrow"
+            tmp = path.with_name(path.name + ".tmp")
+            with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                writer.write_batch(batch)
+            years[str(year)] = {
+                "rows": len(group),
+                "first": group[0][date_index],
+                "last": group[-1][date_index],
+                "sha256": _sha256(tmp),
+            }
+            os.replace(tmp, path)
+        manifest = {
+            "format": FORMAT,
+            "table": table.name,
+            "source_key": source_key,
+            "stock_key": stock_key,
+            "through": through,
+            "rows": len(rows),
+            "load_ts": load_ts.isoformat() if load_ts else None,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+            "years": years,
+        }
+        _write_atomic(directory / MANIFEST, json.dumps(manifest, indent=1).encode())
+        # Only after the new manifest is in place, so readers never miss a listed file
+        for path in directory.glob("*.arrow"):
+            if path.stem not in years:
+                path.unlink()
+
+    async def build(
+        self, db: AsyncSession, table: FactTable, source_key: int, through: int,
+        stock_keys: Optional[list[int]] = None,
+    ) -> tuple[int, int]:
+        """Write every slice of `table`/`source_key` up to `through`; returns (slices, rows)."""
+        m = table.model
+        stmt = (
+            table.select()
+            .add_columns(table.row_key.label(ROW_KEY), m.stock_key.label("_stock_key"), m.load_ts.label("_load_ts"))
+            .where(m.source_key == source_key, m.date_key <= through)
+        )
+        if stock_keys is not None:
+            stmt = stmt.where(m.stock_key.in_(stock_keys))
+        stmt = stmt.order_by(m.stock_key, m.date_key, table.row_key).execution_options(
+            yield_per=settings.export_batch_size
+        )
+
+        # Rows are the output fields and the row key, then stock_key and load_ts
+        n = len(table.fields) + 1
+        slices = total = 0
+        current, rows, load_ts = None, [], None
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            for r in partition:
+                if r[n] != current:
+                    if rows:
+                        self._write_slice(table, source_key, current, through, rows, load_ts)
+                        slices, total = slices + 1, total + len(rows)
+                    current, rows, load_ts = r[n], [], None
+                rows.append(tuple(r[:n]))
+                if r[n + 1] is not None and (load_ts is None or r[n + 1] > load_ts):
+                    load_ts = r[n + 1]
+        if rows:
+            self._write_slice(table, source_key, current, through, rows, load_ts)
+            slices, total = slices + 1, total + len(rows)
+        return slices, total
+
+    def manifests(self, tables: Optional[list[FactTable]] = None):
+        """(table, manifest path) of every built slice."""
+        for table in tables or FACT_TABLES.values():
+            for path in sorted((self.root / table.name).glob(f"*/*/{MANIFEST}")):
+                yield table, path
+
+    def check_files(self, path: Path) -> Optional[str]:
+        """Problem with a slice's files, or None if every listed year file matches its manifest."""
+        try:
+            manifest = json.loads(path.read_bytes())
+            if manifest.get("format") != FORMAT:
+                return "built in an older format; rebuild it"
+            for year, entry in manifest["years"].items():
+                file = path.parent / f"{year}.arrow"
+                if not file.exists():
+                    return f"missing {file.name}"
+                if _sha256(file) != entry["sha256"]:
+                    return f"checksum mismatch in {file.name}"
+                if pa.ipc.open_file(pa.memory_map(str(file))).read_all().num_rows != entry["rows"]:
+                    return f"row count mismatch in {file.name}"
+        except (OSError, ValueError, KeyError, pa.ArrowException) as exc:
+            return f"unreadable: {exc}"
+        return None
+
+    async def check_database(self, db: AsyncSession, table: FactTable, manifests: list[tuple[Path, dict]]) -> dict:
+        """Slices whose row count or latest load_ts up to `through` no longer match Postgres."""
+        m = table.model
+        stale = {}
+        groups = itertools.groupby(
+            sorted(manifests, key=lambda pm: (pm[1]["source_key"], pm[1]["through"])),
+            key=lambda pm: (pm[1]["source_key"], pm[1]["through"]),
+        )
+        for (source_key, through), group in groups:
+            res = await db.execute(
+                select(m.stock_key, func.count(), func.max(m.load_ts))
+                .where(m.source_key == source_key, m.date_key <= through)
+                .group_by(m.stock_key)
+            )
+            current = {stock_key: (count, load_ts) for stock_key, count, load_ts in res.all()}
+            for path, manifest in group:
+                count, load_ts = current.get(manifest["stock_key"], (0, None))
+                if count != manifest["rows"]:
+                    stale[path] = f"{count} rows in Postgres, {manifest['rows']} cached"
+                elif (load_ts.isoformat() if load_ts else None) != manifest["load_ts"]:
+                    stale[path] = "reloaded since the slice was built"
+        return stale
+
+
+history_cache = HistoryCache(settings.disk_cache_dir, settings.disk_cache_open_files)
+
+
+def _tables(names: Optional[str]) -> list[FactTable]:
+    if not names:
+        return list(FACT_TABLES.values())
+    unknown = [n for n in names.split(",") if n.strip() not in FACT_TABLES]
+    if unknown:
+        sys.exit(f"Unknown tables: {', '.join(unknown)} (choose from {', '.join(FACT_TABLES)})")
+    return [FACT_TABLES[n.strip()] for n in names.split(",")]
+
+
+async def _build(args, cache: HistoryCache) -> None:
+    through = closed_through(args.closed_days)
+    async with HeavySessionLocal() as db:
+        stock_keys = None
+        if args.symbols:
+            res = await db.execute(
+                select(models.DimStock.stock_key).where(models.DimStock.nk_symbol.in_(args.symbols.split(",")))
+            )
+            stock_keys = list(res.scalars())
+            if not stock_keys:
+                sys.exit("None of the symbols were found")
+        sources = list((await db.execute(select(models.DimSource.source_key))).scalars())
+        for table in _tables(args.tables):
+            for source_key in sources:
+                slices, rows = await cache.build(db, table, source_key, through, stock_keys)
+                print(f"{table.name} source {source_key}: {slices} slices, {rows} rows through {through}")
+
+
+async def _verify(args, cache: HistoryCache) -> int:
+    problems = 0
+    by_table: dict[str, list] = {}
+    for table, path in cache.manifests(_tables(args.tables)):
+        problem = cache.check_files(path)
+        if problem:
+            print(f"{path.parent}: {problem}")
+            problems += 1
+        else:
+            by_table.setdefault(table.name, []).append((path, json.loads(path.read_bytes())))
+    if not args.files_only:
+        async with HeavySessionLocal() as db:
+            for name, manifests in by_table.items():
+                for path, reason in (await cache.check_database(db, FACT_TABLES[name], manifests)).items():
+                    print(f"{path.parent}: {reason}")
+                    problems += 1
+    print(f"{sum(len(m) for m in by_table.values())} slices checked, {problems} problems")
+    return problems
+
+
+async def _prune(args, cache: HistoryCache) -> None:
+    async with HeavySessionLocal() as db:
+        stocks = {str(k) for k in (await db.execute(select(models.DimStock.stock_key))).scalars()}
+        sources = {str(k) for k in (await db.execute(select(models.DimSource.source_key))).scalars()}
+        doomed = [p for p in cache.root.iterdir() if p.name not in FACT_TABLES] if cache.root.exists() else []
+        stale_candidates: dict[str, list] = {}
+        for table in FACT_TABLES.values():
+            for slice_dir in sorted((cache.root / table.name).glob("*/*")):
+                manifest = slice_dir / MANIFEST
+                if slice_dir.parent.name not in sources or slice_dir.name not in stocks or not manifest.exists():
+                    doomed.append(slice_dir)
+                elif cache.check_files(manifest):
+                    doomed.append(slice_dir)
+                else:
+                    listed = json.loads(manifest.read_bytes())
+                    doomed += [p for p in slice_dir.iterdir() if p.name != MANIFEST and p.stem not in listed["years"]]
+                    stale_candidates.setdefault(table.name, []).append((manifest, listed))
+        if args.stale:
+            for name, manifests in stale_candidates.items():
+                doomed += [path.parent for path in await cache.check_database(db, FACT_TABLES[name], manifests)]
+    for path in doomed:
+        print(("would remove " if args.dry_run else "removing ") + str(path))
+        if not args.dry_run:
+            shutil.rmtree(path) if path.is_dir() else path.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=settings.disk_cache_dir, help="cache root (default DISK_CACHE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write closed history of every stock/source slice")
+    build.add_argument("--tables", help=f"comma-separated subset of {','.join(FACT_TABLES)}")
+    build.add_argument("--symbols", help="comma-separated symbols; default all")
+    build.add_argument("--closed-days", type=int, default=settings.disk_cache_closed_days,
+                       help="leave rows newer than this many days to Postgres")
+    verify = commands.add_parser("verify", help="check files against manifests and Postgres")
+    verify.add_argument("--tables")
+    verify.add_argument("--files-only", action="store_true", help="skip the Postgres comparison")
+    prune = commands.add_parser("prune", help="remove orphaned, corrupt and (with --stale) outdated slices")
+    prune.add_argument("--stale", action="store_true", help="also remove slices that no longer match Postgres")
+    prune.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if pa is None:
+        sys.exit("pyarrow is required for the history cache")
+    if not args.dir:
+        sys.exit("Set DISK_CACHE_DIR or pass --dir")
+    cache = HistoryCache(args.dir, settings.disk_cache_open_files)
+    if args.command == "build":
+        asyncio.run(_build(args, cache))
+    elif args.command == "verify":
+        sys.exit(1 if asyncio.run(_verify(args, cache)) else 0)
+    else:
+        asyncio.run(_prune(args, cache))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from fastapi import HTTPException
+
+# name -> default params; callers may override any prefix of them
+DEFAULTS = {
+    "sma": (20,),
+    "ema": (20,),
+    "rsi": (14,),
+    "macd": (12, 26, 9),
+    "bbands": (20, 2),
+    "atr": (14,),
+}
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    name: str
+    params: tuple
+
+    @property
+    def label(self) -> str:
+        return "_".join([self.name, *(f"{p:g}" for p in self.params)])
+
+    @property
+    def warmup(self) -> int:
+        """Rows needed before the first output so recursive averages have converged."""
+        if self.name in ("sma", "bbands"):
+            return int(self.params[0]) - 1
+        if self.name == "macd":
+            return 3 * int(self.params[1]) + int(self.params[2])
+        return 3 * int(self.params[0]) + 1
+
+
+def parse_specs(raw: str) -> tuple[IndicatorSpec, ...]:
+    """Parse "sma:20,ema:50,macd:12:26:9" into specs; 400 on anything unknown."""
+    specs = []
+    for item in filter(None, (part.strip().lower() for part in raw.split(","))):
+        name, *args = item.split(":")
+        if name not in DEFAULTS:
+            raise HTTPException(status_code=400, detail=f"Unknown indicator: {name}")
+        defaults = DEFAULTS[name]
+        if len(args) > len(defaults):
+            raise HTTPException(status_code=400, detail=f"Too many parameters for {name}")
+        try:
+            params = tuple(float(a) if name == "bbands" and i == 1 else int(a) for i, a in enumerate(args))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid parameters for {name}")
+        params = params + defaults[len(params):]
+        if any(p <= 0 for p in params) or any(int(p) > 1000 for p in params):
+            raise HTTPException(status_code=400, detail=f"Invalid parameters for {name}")
+        specs.append(IndicatorSpec(name, params))
+    if not specs:
+        raise HTTPException(status_code=400, detail="No indicators requested")
+    return tuple(dict.fromkeys(specs))
+
+
+def _ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    """y[0] = x[0]; y[t] = (1 - alpha) * y[t-1] + alpha * x[t], without a Python loop per row.
+
+    The recurrence is solved in closed form over blocks short enough that
+    (1 - alpha) ** -block stays within float range, carrying y across blocks.
+    """
+    y = np.empty_like(x)
+    if len(x) == 0:
+        return y
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        return x.copy()
+    block = max(1, int(150 / -math.log10(decay)))
+    y[0] = x[0]
+    powers = decay ** np.arange(1, block + 1)
+    for start in range(1, len(x), block):
+        chunk = x[start:start + block]
+        p = powers[:len(chunk)]
+        y[start:start + len(chunk)] = p * (y[start - 1] + alpha * np.cumsum(chunk / p))
+    return y
+
+
+def _nan(n: int) -> np.ndarray:
+    return np.full(n, np.nan)
+
+
+def sma(x: np.ndarray, n: int) -> np.ndarray:
+    out = _nan(len(x))
+    if len(x) >= n:
+        c = np.cumsum(np.insert(x, 0, 0.0))
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    return _ewm(x, 2.0 / (n + 1))
+
+
+def rma(x: np.ndarray, n: int) -> np.ndarray:
+    """Wilder's moving average, seeded with the simple mean of the first n values."""
+    out = _nan(len(x))
+    if len(x) >= n:
+        seeded = x[n - 1:].copy()
+        seeded[0] = x[:n].mean()
+        out[n - 1:] = _ewm(seeded, 1.0 / n)
+    return out
+
+
+def rsi(close: np.ndarray, n: int) -> np.ndarray:
+    delta = np.diff(close)
+    gain = rma(np.clip(delta, 0, None), n)
+    loss = rma(np.clip(-delta, 0, None), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    return np.concatenate(([np.nan], value))
+
+
+def macd(close: np.ndarray, fast: int, slow: int, signal: int) -> dict[str, np.ndarray]:
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {"line": line, "signal": signal_line, "hist": line - signal_line}
+
+
+def bbands(close: np.ndarray, n: int, k: float) -> dict[str, np.ndarray]:
+    middle = sma(close, n)
+    std = _nan(len(close))
+    if len(close) >= n:
+        std[n - 1:] = np.lib.stride_tricks.sliding_window_view(close, n).std(axis=1)
+    return {"upper": middle + k * std, "middle": middle, "lower": middle - k * std}
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, n: int) -> np.ndarray:
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rma(true_range, n)
+
+
+def compute(spec: IndicatorSpec, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> dict[str, np.ndarray]:
+    """Output series for one spec, keyed by column name.
+
+    Bars with a null close (or high/low, for atr) are left out of the calculation
+    and get NaN outputs; the cumulative sums and recursive averages would otherwise
+    turn every later value NaN.
+    """
+    valid = ~np.isnan(close)
+    if spec.name == "atr":
+        valid &= ~np.isnan(high) & ~np.isnan(low)
+    if valid.all():
+        return _compute(spec, high, low, close)
+    output = {}
+    for name, values in _compute(spec, high[valid], low[valid], close[valid]).items():
+        output[name] = _nan(len(close))
+        output[name][valid] = values
+    return output
+
+
+def _compute(spec: IndicatorSpec, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> dict[str, np.ndarray]:
+    p = spec.params
+    if spec.name == "sma":
+        return {spec.label: sma(close, p[0])}
+    if spec.name == "ema":
+        return {spec.label: ema(close, p[0])}
+    if spec.name == "rsi":
+        return {spec.label: rsi(close, p[0])}
+    if spec.name == "atr":
+        return {spec.label: atr(high, low, close, p[0])}
+    parts = macd(close, *p) if spec.name == "macd" else bbands(close, *p)
+    return {f"{spec.label}_{part}": values for part, values in parts.items()}
@@ -0,0 +1,340 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings
+from dimensions import dimension_cache
+import models
+
+# Per-industry daily series kept for every source
+FIELDS = (
+    "cap_weighted_return",
+    "equal_weighted_return",
+    "volume",
+    "advancers",
+    "decliners",
+    "unchanged",
+    "members",
+)
+RETURN_FIELDS = ("cap_weighted_return", "equal_weighted_return")
+# Combined (stock_key, date_key) sort key; date_key is YYYYMMDD
+_DATE_SPAN = 10 ** 8
+
+
+def _next_year(date_key: int) -> int:
+    return (date_key // 10000 + 1) * 10000 + 101
+
+
+def _columns(rows, n: int) -> list[np.ndarray]:
+    if not rows:
+        return [np.empty(0, dtype=np.float64) for _ in range(n)]
+    return [np.array(col, dtype=np.float64) for col in zip(*rows)]
+
+
+def _industry_of(stock_key: int) -> Optional[str]:
+    """Industry of a stock, None when it has no industry or no dim_stock row."""
+    stock = dimension_cache.stock_by_key(stock_key)
+    return stock.industry if stock else None
+
+
+@dataclass
+class _Series:
+    """Aggregates of one source plus the state needed to extend them."""
+
+    industries: list[str] = field(default_factory=list)
+    dates: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    # field -> (dates x industries) matrix, columns ordered like `industries`
+    values: dict[str, np.ndarray] = field(default_factory=dict)
+    # Last close and last known market cap per stock, as of `through`
+    last_close: dict[int, float] = field(default_factory=dict)
+    last_cap: dict[int, float] = field(default_factory=dict)
+    # Industry each aggregated stock was counted in
+    industry_of: dict[int, str] = field(default_factory=dict)
+    # Last date_key covered, or 0 before the first build
+    through: int = 0
+
+
+def daily_aggregates(
+    stock_keys: np.ndarray, date_keys: np.ndarray, close: np.ndarray, volume: np.ndarray, splits: np.ndarray,
+    cap_stock_keys: np.ndarray, cap_date_keys: np.ndarray, caps: np.ndarray,
+    series: _Series, column_of: dict[str, int],
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Aggregate one date range of bars into (dates, field -> dates x industries).
+
+    Bars and market caps must be sorted by (stock_key, date_key). A stock's first
+    bar takes its previous close from `series.last_close`; each bar is weighted by
+    the latest market cap dated before it, falling back to `series.last_cap`.
+    Returns are split-adjusted price returns. `series` carry state is updated.
+    """
+    n_ind = len(column_of)
+    dates = np.unique(date_keys).astype(np.int64)
+    if not len(dates):
+        return dates, {}
+    stocks, inverse = np.unique(stock_keys, return_inverse=True)
+    stock_list = stocks.astype(np.int64).tolist()
+    industry = np.array([column_of.get(series.industry_of.get(k), -1) for k in stock_list], dtype=np.int64)[inverse]
+
+    starts = np.r_[True, stock_keys[1:] != stock_keys[:-1]]
+    prev = np.r_[np.nan, close[:-1]]
+    prev[starts] = [series.last_close.get(int(k), np.nan) for k in stock_keys[starts]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = close * np.where(splits > 0, splits, 1.0) / prev - 1
+    valid = (industry >= 0) & np.isfinite(ret) & (prev > 0) & (close > 0)
+
+    # As-of market cap: latest fact_key_ratios row dated strictly before the bar
+    cap_keys = cap_stock_keys.astype(np.int64) * _DATE_SPAN + cap_date_keys.astype(np.int64)
+    bar_keys = stock_keys.astype(np.int64) * _DATE_SPAN + date_keys.astype(np.int64)
+    j = np.searchsorted(cap_keys, bar_keys, side="left") - 1
+    hit = (j >= 0) & (cap_stock_keys[np.maximum(j, 0)] == stock_keys) if len(cap_keys) else np.zeros(len(bar_keys), bool)
+    carried = np.array([series.last_cap.get(k, np.nan) for k in stock_list])[inverse]
+    cap = np.where(hit, caps[np.maximum(j, 0)] if len(caps) else np.nan, carried)
+    weighted = valid & (cap > 0)
+
+    group = np.searchsorted(dates, date_keys) * n_ind + industry
+    size = len(dates) * n_ind
+
+    def total(mask, weights=None):
+        return np.bincount(group[mask], weights=None if weights is None else weights[mask], minlength=size)
+
+    member = industry >= 0
+    counted = total(valid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        equal = total(valid, ret) / counted
+        cap_weighted = total(weighted, cap * ret) / total(weighted, cap)
+    advancers = total(valid & (ret > 0))
+    decliners = total(valid & (ret < 0))
+    values = {
+        "cap_weighted_return": cap_weighted,
+        "equal_weighted_return": equal,
+        "volume": np.rint(total(member, np.nan_to_num(volume))).astype(np.int64),
+        "advancers": advancers.astype(np.int32),
+        "decliners": decliners.astype(np.int32),
+        "unchanged": (counted - advancers - decliners).astype(np.int32),
+        "members": total(member).astype(np.int32),
+    }
+
+    ends = np.r_[stock_keys[1:] != stock_keys[:-1], True]
+    series.last_close.update(zip(stock_keys[ends].astype(np.int64).tolist(), close[ends].tolist()))
+    if len(cap_stock_keys):
+        cap_ends = np.r_[cap_stock_keys[1:] != cap_stock_keys[:-1], True]
+        series.last_cap.update(zip(cap_stock_keys[cap_ends].astype(np.int64).tolist(), caps[cap_ends].tolist()))
+    return dates, {name: v.reshape(len(dates), n_ind) for name, v in values.items()}
+
+
+class IndustryAggregates:
+    """Daily per-industry aggregates of fact_ohlcv, per source, kept in memory.
+
+    Built once from the full history in one-year chunks, then extended: when
+    max(load_ts) of fact_ohlcv or fact_key_ratios changes (checked at most every
+    `refresh_interval` seconds), only dates from the earliest newly loaded row on
+    are recomputed and appended. A backfill into already aggregated dates
+    truncates there and recomputes forward. Only moving a stock that has
+    aggregated history to another industry rebuilds a source from scratch,
+    because dim_stock.industry isn't historized.
+
+    Cap weights are each stock's market cap from its latest fact_key_ratios row
+    dated before the day; stocks without one count in the equal-weighted return only.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._series: dict[int, _Series] = {}
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def as_of(self):
+        """Latest fact_ohlcv load_ts included in the aggregates."""
+        return self._version[0] if self._version else None
+
+    async def _current_version(self, db: AsyncSession) -> tuple:
+        res = await db.execute(select(
+            select(func.max(models.FactOhlcv.load_ts)).scalar_subquery(),
+            select(func.max(models.FactKeyRatios.load_ts)).scalar_subquery(),
+        ))
+        return (*res.one(), dimension_cache.version)
+
+    async def _loaded_since(self, db: AsyncSession, model, seen) -> dict[int, int]:
+        """Earliest date_key per source among rows loaded after `seen` (all rows if None)."""
+        stmt = select(model.source_key, func.min(model.date_key)).group_by(model.source_key)
+        if seen is not None:
+            stmt = stmt.where(model.load_ts > seen)
+        return {source_key: date_key for source_key, date_key in (await db.execute(stmt)).all()}
+
+    async def _carry(self, db: AsyncSession, source_key: int, before: int, series: _Series) -> None:
+        """Reset the carry state to the last close and market cap dated before `before`."""
+        m, k = models.FactOhlcv, models.FactKeyRatios
+        closes = await db.execute(
+            select(m.stock_key, m.close_price)
+            .where(m.source_key == source_key, m.date_key < before)
+            .distinct(m.stock_key).order_by(m.stock_key, m.date_key.desc())
+        )
+        caps = await db.execute(
+            select(k.stock_key, k.market_cap)
+            .where(k.source_key == source_key, k.market_cap > 0, k.date_key < before)
+            .distinct(k.stock_key).order_by(k.stock_key, k.date_key.desc())
+        )
+        series.last_close = {s: c if c is not None else np.nan for s, c in closes.all()}
+        series.last_cap = dict(caps.all())
+
+    async def _extend(self, db: AsyncSession, source_key: int, old: Optional[_Series], start: Optional[int]) -> _Series:
+        """Recompute `old` from date_key `start` on (from scratch when `old` or `start` is None)."""
+        m, k = models.FactOhlcv, models.FactKeyRatios
+        res = await db.execute(
+            select(func.min(m.date_key), func.max(m.date_key)).where(m.source_key == source_key)
+        )
+        first, last = res.one()
+
+        series = _Series()
+        if old is not None and start is not None:
+            series.industry_of = dict(old.industry_of)
+            if start <= old.through:
+                keep = old.dates < start
+                series.industries = list(old.industries)
+                series.dates = old.dates[keep]
+                series.values = {name: v[keep] for name, v in old.values.items()}
+                await self._carry(db, source_key, start, series)
+            else:
+                series.industries, series.dates, series.values = list(old.industries), old.dates, dict(old.values)
+                series.last_close, series.last_cap = dict(old.last_close), dict(old.last_cap)
+                series.through = old.through
+                start = old.through + 1
+            cap_from = start
+        else:
+            start, cap_from = first, None
+        if first is None or start > last:
+            series.through = max(series.through, last or 0)
+            return series
+
+        industries = {s.industry for s in dimension_cache.stocks() if s.industry}
+        for name in sorted(industries - set(series.industries)):
+            # Industries seen for the first time get empty history
+            series.industries.append(name)
+        column_of = {name: i for i, name in enumerate(series.industries)}
+        n_ind = len(column_of)
+        if not series.values:
+            series.values = {
+                name: np.empty((0, n_ind), dtype=np.float64 if name in RETURN_FIELDS else np.int64)
+                for name in FIELDS
+            }
+        for name, v in series.values.items():
+            if v.shape[1] < n_ind:
+                pad = np.nan if name in RETURN_FIELDS else 0
+                series.values[name] = np.pad(v, ((0, 0), (0, n_ind - v.shape[1])), constant_values=pad)
+
+        dates, chunks = [series.dates], {name: [v] for name, v in series.values.items()}
+        lo = start
+        while lo <= last:
+            hi = min(_next_year(lo), last + 1)
+            bars = (await db.execute(
+                select(m.stock_key, m.date_key, m.close_price, m.volume, m.stock_splits)
+                .where(m.source_key == source_key, m.date_key >= lo, m.date_key < hi)
+                .order_by(m.stock_key, m.date_key)
+            )).all()
+            cap_stmt = (
+                select(k.stock_key, k.date_key, k.market_cap)
+                .where(k.source_key == source_key, k.market_cap > 0, k.date_key < hi)
+                .order_by(k.stock_key, k.date_key)
+            )
+            if cap_from is not None:
+                cap_stmt = cap_stmt.where(k.date_key >= cap_from)
+            caps = (await db.execute(cap_stmt)).all()
+
+            stock_keys, date_keys, close, volume, splits = _columns(bars, 5)
+            cap_stock_keys, cap_date_keys, cap_values = _columns(caps, 3)
+            for stock_key in np.unique(stock_keys).astype(np.int64).tolist():
+                if stock_key not in series.industry_of:
+                    series.industry_of[stock_key] = _industry_of(stock_key)
+            chunk_dates, values = daily_aggregates(
+                stock_keys, date_keys, close, np.nan_to_num(volume), np.nan_to_num(splits),
+                cap_stock_keys, cap_date_keys, cap_values, series, column_of,
+            )
+            if len(chunk_dates):
+                dates.append(chunk_dates)
+                for name, v in values.items():
+                    chunks[name].append(v)
+            lo = cap_from = hi
+
+        series.dates = np.concatenate(dates)
+        series.values = {name: np.concatenate(parts) for name, parts in chunks.items()}
+        series.through = last
+        return series
+
+    async def _refresh(self, db: AsyncSession, version: tuple) -> None:
+        seen_prices, seen_caps = self._version[:2] if self._version else (None, None)
+        prices = await self._loaded_since(db, models.FactOhlcv, seen_prices)
+        caps = await self._loaded_since(db, models.FactKeyRatios, seen_caps)
+        series = dict(self._series)
+        for source_key in sorted(prices.keys() | caps.keys() | series.keys()):
+            old = series.get(source_key)
+            # Stocks without a dimension row were recorded under None, so they only force a rebuild once they get one
+            if old is not None and any(
+                _industry_of(stock_key) != industry for stock_key, industry in old.industry_of.items()
+            ):
+                series[source_key] = await self._extend(db, source_key, None, None)
+                continue
+            changed = []
+            if source_key in prices:
+                changed.append(prices[source_key])
+            if source_key in caps:
+                # A market cap dated d weights the days after d
+                changed.append(caps[source_key] + 1)
+            if old is None or changed:
+                series[source_key] = await self._extend(db, source_key, old, min(changed, default=None))
+        self._series = series
+        self._version = version
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Extend the aggregates for newly loaded rows; readers keep the old copy meanwhile."""
+        if self._version and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if self._version and self._lock.locked():
+            return
+        async with self._lock:
+            checked_at = time.monotonic()
+            if self._version and checked_at - self._checked_at < self.refresh_interval:
+                return
+            await dimension_cache.ensure_fresh(db)
+            version = await self._current_version(db)
+            if version != self._version:
+                await self._refresh(db, version)
+            self._checked_at = checked_at
+
+    def series(
+        self, source_key: int, industry: str, start_date: Optional[int] = None, end_date: Optional[int] = None,
+    ) -> Optional[tuple[str, np.ndarray, dict[str, np.ndarray]]]:
+        """(industry, date_keys, field -> values) of one industry, matched case-insensitively; None if unknown."""
+        series = self._series.get(source_key)
+        if series is None:
+            return None
+        wanted = industry.strip().lower()
+        column = next((i for i, name in enumerate(series.industries) if name.lower() == wanted), None)
+        if column is None:
+            return None
+        lo = np.searchsorted(series.dates, start_date, side="left") if start_date else 0
+        hi = np.searchsorted(series.dates, end_date, side="right") if end_date else len(series.dates)
+        values = {name: v[lo:hi, column] for name, v in series.values.items()}
+        return series.industries[column], series.dates[lo:hi], values
+
+    def latest(self, source_key: int) -> tuple[Optional[int], list[dict]]:
+        """Each industry's aggregates on the latest aggregated date."""
+        series = self._series.get(source_key)
+        if series is None or not len(series.dates):
+            return None, []
+        rows = []
+        for column, name in sorted(enumerate(series.industries), key=lambda c: c[1]):
+            row = {"industry": name}
+            for f, v in series.values.items():
+                value = v[-1, column].item()
+                row[f] = None if value != value else value
+            rows.append(row)
+        return int(series.dates[-1]), rows
+
+
+industry_aggregates = IndustryAggregates(settings.snapshot_refresh_seconds)
@@ -1,14 +1,99 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy import text, select
+from fastapi import FastAPI, Depends, HTTPException, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text, select, func, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from datetime import datetime
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+import asyncio
 from sqlalchemy import and_
+import logging
 
-from database import get_db
+from database import get_db, get_read_db, get_heavy_db, settings, HeavySessionLocal, replica_set
+from dimensions import dimension_cache
+import facts
+from facts import FACT_TABLES
+from formats import STREAM_ENCODERS, json_bytes, negotiate_format, tabular_response
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, paginate
+from conditional import basket_load_ts, fact_validators
+from snapshot import market_snapshot
+from screener import ratio_screener, parse_filters, parse_sort
+from search import search_index
+from history_cache import history_cache
+from industry import RETURN_FIELDS, industry_aggregates
+from memo import BoundedCache
+from compression import CompressionMiddleware
+from admission import AdmissionMiddleware
+from singleflight import SingleFlight
+import indicators
+import returns
+import valuation
+from adjustments import adjustment_cache
+import numpy as np
+import metrics
 import models, schemas
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm the in-memory caches so the first requests don't pay for them."""
+    try:
+        async with HeavySessionLocal() as db:
+            await dimension_cache.ensure_fresh(db, force=True)
+            await market_snapshot.ensure_fresh(db)
+            await ratio_screener.ensure_fresh(db)
+            await industry_aggregates.ensure_fresh(db)
+    except Exception:
+        # The caches load lazily on first use; don't block startup on the DB
+        logger.warning("Could not warm caches at startup", exc_info=True)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = metrics.TimedRoute
+app.add_middleware(
+    CompressionMiddleware,
+    encodings=[e.strip().lower() for e in settings.compression_encodings.split(",") if e.strip()],
+    levels={"gzip": settings.gzip_level, "br": settings.brotli_level, "zstd": settings.zstd_level},
+    min_size=settings.compression_min_size,
+)
+heavy_connections = settings.heavy_pool_size + settings.heavy_max_overflow
+app.add_middleware(
+    AdmissionMiddleware,
+    router=app.router,
+    capacities={
+        "heavy": settings.admission_heavy_units_per_connection * heavy_connections,
+        "light": settings.admission_light_capacity,
+    },
+    connections={"heavy": heavy_connections},
+    max_queue=settings.admission_queue_size,
+    max_wait=settings.admission_queue_timeout,
+    rate=settings.rate_limit_per_second,
+    burst=settings.rate_limit_burst,
+    client_header=settings.rate_limit_client_header or None,
+)
+# Added last so it is outermost and its timing covers compression too
+app.add_middleware(metrics.MetricsMiddleware)
+
+indicator_cache = BoundedCache(settings.indicator_cache_size)
+returns_cache = BoundedCache(settings.returns_cache_size)
+valuation_cache = BoundedCache(settings.valuation_cache_size)
+fact_flight = SingleFlight(settings.coalesce_ttl_seconds, settings.coalesce_cache_size)
+
+
+async def require_admin(x_admin_token: str | None = Header(None)):
+    """Guard admin endpoints with ADMIN_TOKEN when it is configured."""
+    if settings.admin_token and x_admin_token != settings.admin_token:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Per-route request, SQL, pool-wait and serialization histograms in Prometheus text format."""
+    return Response(metrics.render_metrics(), media_type=metrics.PROMETHEUS_MEDIA_TYPE)
 
 
 @app.get("/db-test")
@@ -24,40 +109,80 @@ async def db_test(db: AsyncSession = Depends(get_db)):
 async def resolve_stock(db: AsyncSession, symbol: str) -> int:
     """Resolve a stock symbol to stock_key or raise HTTPException(404).
 
-    Symbol matching is case-insensitive and strips whitespace.
+    Symbol matching is case-insensitive and strips whitespace. Lookups are served
+    from the in-memory dimension cache.
     """
-    res = await db.execute(select(models.DimStock.stock_key).where(models.DimStock.nk_symbol.ilike(symbol.strip())))
-    stock_key = res.scalar_one_or_none()
-    if not stock_key:
+    stock = await dimension_cache.get_stock(db, symbol)
+    if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
-    return stock_key
+    return stock.stock_key
 
 async def resolve_stock_and_source(db: AsyncSession, symbol: str, source: str) -> tuple[int, int]:
     """Resolve symbol -> stock_key and source -> source_key; raise 404 if either missing."""
     stock_key = await resolve_stock(db, symbol)
-    res = await db.execute(select(models.DimSource.source_key).where(models.DimSource.source_name.ilike(source.strip())))
-    source_key = res.scalar_one_or_none()
+    source_key = await dimension_cache.get_source_key(db, source)
     if not source_key:
         raise HTTPException(status_code=404, detail="Source not found")
 
     return stock_key, source_key
 
+@app.post("/admin/dimension-cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_dimension_cache(db: AsyncSession = Depends(get_db)):
+    """Drop the cached dim_stock/dim_source snapshot and reload it."""
+    """
+    Sample URL: curl -X POST http://localhost:8000/admin/dimension-cache/invalidate
+    """
+    dimension_cache.invalidate()
+    await dimension_cache.ensure_fresh(db, force=True)
+    return {"ok": True, "stocks": len(dimension_cache.stocks())}
+
 @app.get("/stocks-list", response_model=List[str])
 async def list_stocks(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
-    db: AsyncSession = Depends(get_db),
+    offset: int = Query(0, ge=0, deprecated=True),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """List stocks (read-only) ordered by stock_key, with keyset pagination.
+
+    The X-Next-Cursor response header holds the token for the next page; pass it back
+    as `cursor`. `offset` is kept for old clients and ignored when a cursor is given.
+    """
+    """
+    Sample URL: http://localhost:8000/stocks-list?limit=50&cursor=eyJzIjoic3RvY2tzIiwiayI6NTB9
+    """
+    stmt = select(models.DimStock.stock_key, models.DimStock.nk_symbol).order_by(models.DimStock.stock_key)
+    if cursor:
+        stmt = stmt.where(models.DimStock.stock_key > decode_cursor("stocks", cursor))
+    elif offset:
+        stmt = stmt.offset(offset)
+    result = await db.execute(stmt.limit(limit + 1))
+    rows, next_cursor = paginate(result.all(), limit, "stocks", key=lambda r: r.stock_key)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [r.nk_symbol for r in rows]
+
+@app.get("/search", response_model=List[schemas.SearchHit])
+async def search_stocks(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """List stocks (read-only) with pagination."""
+    """Typeahead search over symbols, Yahoo symbols, ISINs and company names.
+
+    Served from an in-memory index rebuilt whenever the dimension cache reloads
+    dim_stock; a keystroke costs no query once the cache is fresh.
+    """
     """
-    Sample URL: http://localhost:8000/stocks-list?limit=50&offset=0
+    Sample URL: http://localhost:8000/search?q=reli&limit=5
     """
-    result = await db.execute(select(models.DimStock.nk_symbol).limit(limit).offset(offset))
-    stocks = result.scalars().all()
-    return stocks
+    await dimension_cache.ensure_fresh(db)
+    search_index.ensure_current()
+    return Response(json_bytes(search_index.search(q, limit)), media_type="application/json")
 
 @app.get("/stock-info/{symbol}", response_model=schemas.StockOut)
-async def get_stock_by_symbol(symbol: str, db: AsyncSession = Depends(get_db)):
+async def get_stock_by_symbol(symbol: str, db: AsyncSession = Depends(get_read_db)):
     """Fetch a single stock by its symbol (read-only)."""
     """
     Sample URL: http://localhost:8000/stock-info/RELIANCE
@@ -68,73 +193,731 @@ async def get_stock_by_symbol(symbol: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Stock not found")
     return stock
 
+def _project(table, fields):
+    """`table` narrowed to a comma-separated `fields=` list of output names."""
+    try:
+        return table.project([f.strip() for f in fields.split(",") if f.strip()] if fields else None)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {exc}")
+
+async def _release(db: AsyncSession) -> None:
+    """Return the request session's connection before work that opens sessions of its own.
+
+    Shared load_ts lookups and coalesced page queries check out from the same pools
+    as the request dependencies; holding one connection while waiting for another
+    exhausts a small pool under load. The session reconnects if it is used again.
+    """
+    await db.close()
+
+def _fact_query(table, stock_key, source_key, start_date, end_date, cursor):
+    """Labelled range query for a fact table, continuing after `cursor` if given.
+
+    Returns the query and the decoded (date_key, row_key) cursor position.
+    """
+    after = decode_cursor(table.name, cursor, parts=2) if cursor else None
+    return table.query(stock_key, source_key, start_date, end_date, after=after), after
+
+async def _fact_response(
+    table, fmt, symbol, stmt, limit, scope, validators, key, sessions=None, envelope=False, history=None,
+    position=None,
+):
+    """Run a labelled fact query and serialize one page straight from the DB rows.
+
+    The select already carries the output field names, so rows stay plain tuples: no
+    ORM instances, no map_row copy and no response_model re-validation. JSON is
+    either a bare list or, with `envelope`, the {"symbol", "data", "next_cursor"} shape.
+
+    Concurrent requests for the same page share one query and one serialized body.
+    A page is identified by `key` (the caller's normalized query parameters), page
+    size, format and the slice's load_ts. The query runs on a session of its own
+    from `sessions` (the read pool by default); callers _release their request
+    session first so the page never waits on a second connection from the same pool.
+
+    `table` may be projected (FactTable.project); only its fields are selected and sent.
+    `history` is (stock_key, source_key, start_date, end_date, after) for plain range
+    pages that the on-disk history cache can serve; `stmt` is then only used for
+    slices that aren't cached. `position` gives a row's cursor key: table.position_of
+    (date_key, row_key) for range queries, unless the caller's rows are unique per date.
+    """
+    echo = symbol.strip() if envelope or fmt != "json" else None
+
+    async def page():
+        async with (sessions or replica_set.session)() as db:
+            rows = None
+            if history is not None:
+                rows = await history_cache.page(db, table, *history, limit + 1)
+            if rows is None:
+                rows = (await db.execute(stmt.limit(limit + 1))).all()
+            rows, next_cursor = paginate(rows, limit, scope, key=position or table.position_of)
+        if fmt == "json":
+            data = table.dicts(rows)
+            body = {"symbol": echo, "data": data, "next_cursor": next_cursor} if envelope else data
+            return json_bytes(body), "application/json", next_cursor
+        meta = {"symbol": echo}
+        if next_cursor:
+            meta["next_cursor"] = next_cursor
+        response = tabular_response(fmt, table, rows, meta)
+        return response.body, response.media_type, next_cursor
+
+    flight_key = (scope, key, tuple(table.fields), limit, fmt, echo, envelope, validators.last_modified)
+    body, media_type, next_cursor = await fact_flight.do(flight_key, page)
+    response = Response(body, media_type=media_type, headers=validators.headers())
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+async def _fetch_fact_dicts(table, stock_key, source_key, limit):
+    """Latest `limit` rows of a fact table on a session of its own, so callers can gather."""
+    async with replica_set.session() as db:
+        result = await db.execute(table.query(stock_key, source_key).limit(limit))
+        return [dict(zip(table.fields, table.convert_row(r))) for r in result]
+
+@app.get("/stock-profile/{symbol}", response_model=schemas.StockProfileOut)
+async def get_stock_profile(
+    symbol: str,
+    source: str,
+    limit: int = Query(20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Company page in one call: stock info plus the latest fundamentals and recommendations.
+
+    The symbol is resolved once; the five fact queries run concurrently, each on its
+    own pooled session, so latency tracks the slowest query rather than their sum.
+    `limit` caps the rows returned per section.
+    """
+    """
+    Sample URL: http://localhost:8000/stock-profile/RELIANCE?source=YFIN&limit=4
+    """
+    stock = await dimension_cache.get_stock(db, symbol)
+    if not stock:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    source_key = await dimension_cache.get_source_key(db, source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+
+    sections = {
+        "balance_sheet": facts.BALANCE_SHEET,
+        "cashflow": facts.CASHFLOW,
+        "income": facts.INCOME,
+        "key_ratios": facts.KEY_RATIOS,
+        "recommendations": facts.RECOMMENDATIONS,
+    }
+    results = await asyncio.gather(
+        *(_fetch_fact_dicts(table, stock.stock_key, source_key, limit) for table in sections.values())
+    )
+    return {
+        "stock": asdict(stock),
+        "source": dimension_cache.source_name(source_key),
+        **dict(zip(sections, results)),
+    }
+
 @app.get("/stock-ohlcv", response_model=schemas.OhlcvList)
 async def get_ohlcv(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,  # YYYYMMDD integer
     end_date: int | None = None,
     limit: int = Query(1000, ge=1, le=10000),
-    db: AsyncSession = Depends(get_db),
+    interval: str = Query("day", pattern="^(day|week|month|quarter)$"),
+    adjusted: str | None = Query(None, pattern="^split([+ ]dividend)?$"),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_heavy_db),
 ):
     """Return OHLCV for a symbol between date_key range.
 
     start_date and end_date are integers in YYYYMMDD format matching dim_date.date_key.
+    Pass format=columnar|arrow (or an Accept header of application/vnd.columnar+json or
+    application/vnd.apache.arrow.stream) to get one array per field instead of row objects.
+    When more rows exist than `limit`, `next_cursor` (also sent as X-Next-Cursor) fetches the next page.
+    interval=week|month|quarter aggregates daily rows into bars in SQL; `traded_date` is
+    then the first trading day of each bar.
+    adjusted=split|split+dividend applies cumulative backward adjustment factors for
+    stock_splits (and dividends) to prices and volume before any aggregation.
+    fields=close_price,volume selects only those fields (traded_date is always included).
     """
     """
     Sample URL: http://localhost:8000/stock-ohlcv?symbol=RELIANCE&source=YFIN&start_date=20220101&end_date=20221231&limit=100
     """
+    table = _project(facts.OHLCV, fields)
     stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.OHLCV, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    stmt = select(models.FactOhlcv).where(models.FactOhlcv.stock_key == stock_key)
-    if start_date:
-        stmt = stmt.where(models.FactOhlcv.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactOhlcv.date_key <= end_date)
-    stmt = stmt.order_by(models.FactOhlcv.date_key).limit(limit)
+    columns = mode = None
+    if adjusted:
+        # A "+" in a query string decodes to a space
+        mode = adjusted.replace(" ", "+")
+        factors = await adjustment_cache.get(db, stock_key, source_key, validators.last_modified, mode)
+        columns = factors.ohlcv_columns()
 
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
+    if interval == "day":
+        scope = facts.OHLCV.name
+        after = decode_cursor(scope, cursor, parts=2) if cursor else None
+        stmt = table.query(stock_key, source_key, start_date, end_date, after=after, columns=columns)
+    else:
+        # Cursors hold the first date_key of the last bar; the next page starts at the following bucket
+        scope = f"{facts.OHLCV.name}:{interval}"
+        after = facts.next_bucket_start(decode_cursor(scope, cursor), interval) if cursor else None
+        stmt = facts.resampled_ohlcv_query(
+            stock_key, source_key, interval, start_date, end_date, after, columns, table.fields,
+        )
 
-    # Convert to list of OhlcvOut dicts
-    data = [
-        {
-            "traded_date": datetime.strptime(str(r.date_key), '%Y%m%d'),
+    key = (stock_key, source_key, start_date, end_date, interval, mode, after)
+    # Resampled and adjusted bars are computed in SQL; only raw daily rows come from the history cache
+    history = (stock_key, source_key, start_date, end_date, after) if interval == "day" and not mode else None
+    # The page runs on a heavy session of its own; don't hold this one's connection meanwhile
+    await _release(db)
+    return await _fact_response(
+        table, fmt, symbol, stmt, limit, scope, validators, key,
+        sessions=HeavySessionLocal, envelope=True, history=history,
+        # Resampled bars are unique per bucket, so their cursors hold the date alone
+        position=None if interval == "day" else table.date_key_of,
+    )
+
+def _float_list(values: np.ndarray) -> list:
+    """ndarray -> JSON-ready list with NaN as None."""
+    return [None if v != v else v for v in values.tolist()]
+
+@app.get("/stock-indicators", response_model=schemas.IndicatorsOut)
+async def get_indicators(
+    request: Request,
+    symbol: str,
+    source: str,
+    indicators_spec: str = Query("sma:20", alias="indicators"),
+    start_date: int | None = None,
+    end_date: int | None = None,
+    db: AsyncSession = Depends(get_heavy_db),
+):
+    """Technical indicators computed over fact_ohlcv with NumPy.
+
+    indicators is a comma-separated list of name[:param...]: sma:N, ema:N, rsi:N,
+    macd:FAST:SLOW:SIGNAL, bbands:N:K, atr:N. Enough rows before start_date are read
+    to warm up each indicator. Results are memoized per stock, source, latest load_ts
+    and request, so repeat calls skip both the query and the computation.
+    """
+    """
+    Sample URL: http://localhost:8000/stock-indicators?symbol=RELIANCE&source=YFIN&indicators=sma:50,rsi:14,macd&start_date=20230101
+    """
+    specs = indicators.parse_specs(indicators_spec)
+    stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    validators = await fact_validators(facts.OHLCV, stock_key, source_key, request, "json")
+    if validators.not_modified(request):
+        return validators.not_modified_response()
+
+    cache_key = (stock_key, source_key, validators.last_modified, specs, start_date, end_date)
+    body = indicator_cache.get(cache_key)
+    if body is None:
+        m = models.FactOhlcv
+        base = select(m.date_key, m.high_price, m.low_price, m.close_price).where(
+            m.stock_key == stock_key, m.source_key == source_key
+        )
+        stmt = base
+        if start_date:
+            stmt = stmt.where(m.date_key >= start_date)
+        if end_date:
+            stmt = stmt.where(m.date_key <= end_date)
+        rows = (await db.execute(stmt.order_by(m.date_key))).all()
+
+        warmup_rows = []
+        warmup = max(spec.warmup for spec in specs)
+        if start_date and warmup:
+            warm = base.where(m.date_key < start_date).order_by(m.date_key.desc()).limit(warmup)
+            warmup_rows = (await db.execute(warm)).all()[::-1]
+
+        series = warmup_rows + rows
+        high = np.array([r.high_price for r in series], dtype=float)
+        low = np.array([r.low_price for r in series], dtype=float)
+        close = np.array([r.close_price for r in series], dtype=float)
+        skip = len(warmup_rows)
+
+        output = {}
+        for spec in specs:
+            for name, values in indicators.compute(spec, high, low, close).items():
+                output[name] = _float_list(values[skip:])
+        body = json_bytes({
+            "symbol": symbol.strip(),
+            "source": source.strip(),
+            "traded_date": [facts.date_key_to_datetime(r.date_key) for r in rows],
+            "close": _float_list(close[skip:]),
+            "indicators": output,
+        })
+        indicator_cache.set(cache_key, body)
+
+    return Response(body, media_type="application/json", headers=validators.headers())
+
+@app.get("/stock-valuation", response_model=schemas.ValuationOut)
+async def get_valuation(
+    request: Request,
+    symbol: str,
+    source: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    reporting_lag_days: int = Query(0, ge=0, le=365),
+    db: AsyncSession = Depends(get_heavy_db),
+):
+    """Daily P/E, P/B, P/S, market cap, EV and EV/EBIT from each close and the statements known that day.
+
+    Every close is as-of joined to the latest fact_income and fact_balance_sheet rows
+    dated on or before it with np.searchsorted over the sorted date_keys. EPS,
+    revenue and EBIT are trailing twelve months (the last four quarters). Statements
+    are dated by period end; reporting_lag_days delays their use by that many days
+    to approximate when they were published. market_cap and enterprise_value are in
+    the units of price x shares as reported. Memoized per stock, source, load and request.
+    """
+    """
+    Sample URL: http://localhost:8000/stock-valuation?symbol=RELIANCE&source=YFIN&start_date=20230101&reporting_lag_days=45
+    """
+    stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    validators = await fact_validators(
+        facts.OHLCV, stock_key, source_key, request, "json", also=(facts.INCOME, facts.BALANCE_SHEET)
+    )
+    if validators.not_modified(request):
+        return validators.not_modified_response()
+
+    cache_key = (stock_key, source_key, validators.last_modified, start_date, end_date, reporting_lag_days)
+    body = valuation_cache.get(cache_key)
+    if body is None:
+        m, inc, bal = models.FactOhlcv, models.FactIncome, models.FactBalanceSheet
+        stmt = select(m.date_key, m.close_price).where(m.stock_key == stock_key, m.source_key == source_key)
+        if start_date:
+            stmt = stmt.where(m.date_key >= start_date)
+        if end_date:
+            stmt = stmt.where(m.date_key <= end_date)
+        bars = (await db.execute(stmt.order_by(m.date_key))).all()
+        if not bars:
+            raise HTTPException(status_code=404, detail="OHLCV not found")
+
+        # Statements and splits before start_date still matter for the first days
+        split_rows = (await db.execute(
+            select(m.date_key, m.stock_splits)
+            .where(m.stock_key == stock_key, m.source_key == source_key, m.stock_splits > 0)
+            .order_by(m.date_key)
+        )).all()
+        income_rows = (await db.execute(
+            select(inc.date_key, inc.q_inc_eps, inc.q_inc_trev, inc.q_inc_ebi)
+            .where(inc.stock_key == stock_key, inc.source_key == source_key, inc.date_key <= bars[-1].date_key)
+            .order_by(inc.date_key, inc.load_ts)
+        )).all()
+        balance_rows = (await db.execute(
+            select(bal.date_key, bal.bal_teq, bal.bal_tcso, bal.bal_tdeb, bal.bal_csti)
+            .where(bal.stock_key == stock_key, bal.source_key == source_key, bal.date_key <= bars[-1].date_key)
+            .order_by(bal.date_key, bal.load_ts)
+        )).all()
+
+        def column(rows, i, dtype=float):
+            return np.array([r[i] for r in rows], dtype=dtype)
+
+        income = dict(zip(("date_key", "eps", "revenue", "ebit"), valuation.latest_per_date(
+            column(income_rows, 0, np.int64), *(column(income_rows, i) for i in (1, 2, 3))
+        )))
+        balance = dict(zip(("date_key", "equity", "shares", "debt", "cash"), valuation.latest_per_date(
+            column(balance_rows, 0, np.int64), *(column(balance_rows, i) for i in (1, 2, 3, 4))
+        )))
+        close = column(bars, 1)
+        series = valuation.valuation_series(
+            {"date_key": column(bars, 0, np.int64), "close": close},
+            {"date_key": column(split_rows, 0, np.int64), "ratio": column(split_rows, 1)},
+            income,
+            balance,
+            reporting_lag_days,
+        )
+        body = json_bytes({
+            "symbol": symbol.strip(),
+            "source": source.strip(),
+            "traded_date": [facts.date_key_to_datetime(r.date_key) for r in bars],
+            "close": _float_list(close),
+            **{name: _float_list(series[name]) for name in valuation.FIELDS},
+        })
+        valuation_cache.set(cache_key, body)
+
+    return Response(body, media_type="application/json", headers=validators.headers())
+
+@app.post("/stock-ohlcv/batch", response_model=schemas.OhlcvBatchOut)
+async def get_ohlcv_batch(request: schemas.OhlcvBatchRequest, db: AsyncSession = Depends(get_heavy_db)):
+    """Return OHLCV for many symbols with one set-based query.
+
+    Rows come back grouped by symbol, each capped at `limit` rows in date order.
+    Symbols missing from dim_stock are reported in `not_found` instead of failing the call.
+    """
+    """
+    Sample URL: curl -X POST http://localhost:8000/stock-ohlcv/batch -H 'Content-Type: application/json' \
+        -d '{"symbols": ["RELIANCE", "TCS"], "source": "YFIN", "start_date": 20220101, "limit": 100}'
+    """
+    source_key = await dimension_cache.get_source_key(db, request.source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+
+    symbols = list(dict.fromkeys(s.strip() for s in request.symbols))
+    stocks = await dimension_cache.get_stocks(db, symbols)
+    not_found = [s for s in symbols if s not in stocks]
+    data = {s: [] for s in symbols if s in stocks}
+    if not stocks:
+        return {"source": request.source.strip(), "data": data, "not_found": not_found}
+
+    # Symbols differing only in case resolve to the same stock; each spelling gets the rows
+    symbols_by_key = {}
+    for symbol, stock in stocks.items():
+        symbols_by_key.setdefault(stock.stock_key, []).append(symbol)
+    row_number = func.row_number().over(
+        partition_by=models.FactOhlcv.stock_key, order_by=models.FactOhlcv.date_key
+    ).label("rn")
+    inner = select(
+        models.FactOhlcv.stock_key,
+        models.FactOhlcv.date_key,
+        models.FactOhlcv.open_price,
+        models.FactOhlcv.high_price,
+        models.FactOhlcv.low_price,
+        models.FactOhlcv.close_price,
+        models.FactOhlcv.volume,
+        row_number,
+    ).where(
+        models.FactOhlcv.stock_key == any_(bindparam("stock_keys", list(symbols_by_key), type_=ARRAY(BigInteger))),
+        models.FactOhlcv.source_key == source_key,
+    )
+    if request.start_date:
+        inner = inner.where(models.FactOhlcv.date_key >= request.start_date)
+    if request.end_date:
+        inner = inner.where(models.FactOhlcv.date_key <= request.end_date)
+    inner = inner.subquery()
+    stmt = (
+        select(*(c for c in inner.c if c.name != "rn"))
+        .where(inner.c.rn <= request.limit)
+        .order_by(inner.c.stock_key, inner.c.date_key)
+    )
+
+    result = await db.execute(stmt)
+    for r in result:
+        row = {
+            "traded_date": facts.date_key_to_datetime(r.date_key),
             "open_price": r.open_price,
             "high_price": r.high_price,
             "low_price": r.low_price,
             "close_price": r.close_price,
             "volume": r.volume,
         }
-        for r in rows
-    ]
+        for symbol in symbols_by_key[r.stock_key]:
+            data[symbol].append(row)
+
+    body = {"source": request.source.strip(), "data": data, "not_found": not_found}
+    return Response(json_bytes(body), media_type="application/json")
+
+@app.post("/stock-returns", response_model=schemas.ReturnsOut)
+async def get_returns(request: schemas.ReturnsRequest, db: AsyncSession = Depends(get_heavy_db)):
+    """Return statistics and correlation/covariance matrices for a basket of symbols.
+
+    Closes for the basket and the benchmark come from one `= ANY` query, are
+    adjusted for splits (and dividends with adjusted=split+dividend), aligned on
+    date_key and turned into log or simple returns with NumPy. Mean return and
+    volatility are annualized with periods_per_year; covariance is per period.
+    Results are memoized per request and fact load, so a repeat call costs no query.
+    """
+    """
+    Sample URL: curl -X POST http://localhost:8000/stock-returns -H 'Content-Type: application/json' \
+        -d '{"symbols": ["RELIANCE", "TCS", "INFY"], "source": "YFIN", "benchmark": "NIFTYBEES", "start_date": 20230101}'
+    """
+    source_key = await dimension_cache.get_source_key(db, request.source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+
+    symbols = list(dict.fromkeys(s.strip() for s in request.symbols))
+    benchmark = request.benchmark.strip() if request.benchmark else None
+    stocks = await dimension_cache.get_stocks(db, symbols + ([benchmark] if benchmark else []))
+    if benchmark and benchmark not in stocks:
+        raise HTTPException(status_code=404, detail="Benchmark not found")
+    not_found = [s for s in symbols if s not in stocks]
+    by_key = {}
+    for s in symbols:
+        if s in stocks:
+            # Symbols differing only in case resolve to the same stock
+            by_key.setdefault(stocks[s].stock_key, s)
+    if not by_key:
+        raise HTTPException(status_code=404, detail="Stock not found")
+    bench_key = stocks[benchmark].stock_key if benchmark else None
 
-    return {"symbol": symbol.strip(), "data": data}
+    m = models.FactOhlcv
+    wanted = list(by_key) + ([bench_key] if bench_key and bench_key not in by_key else [])
+    # A load into any of the basket's price slices invalidates the cached result
+    load_ts = await basket_load_ts(db, m, wanted, source_key)
+    cache_key = (
+        source_key, tuple(by_key), bench_key,
+        request.start_date, request.end_date, request.returns, request.missing, request.adjusted,
+        request.periods_per_year, load_ts,
+    )
+    body = returns_cache.get(cache_key)
+    if body is not None:
+        return Response(body, media_type="application/json")
+
+    stmt = select(m.stock_key, m.date_key, m.close_price, m.stock_splits, m.dividends).where(
+        m.stock_key == any_(bindparam("stock_keys", wanted, type_=ARRAY(BigInteger))),
+        m.source_key == source_key,
+        m.close_price > 0,
+    )
+    if request.start_date:
+        stmt = stmt.where(m.date_key >= request.start_date)
+    if request.end_date:
+        stmt = stmt.where(m.date_key <= request.end_date)
+    rows = (await db.execute(stmt.order_by(m.stock_key, m.date_key))).all()
+
+    stock_keys = np.array([r.stock_key for r in rows], dtype=np.int64)
+    date_keys = np.array([r.date_key for r in rows], dtype=np.int64)
+    close = np.array([r.close_price for r in rows], dtype=float)
+    splits = np.array([r.stock_splits or 0.0 for r in rows], dtype=float)
+    dividends = np.array([r.dividends or 0.0 for r in rows], dtype=float)
+
+    # Symbols without prices in the range would empty the aligned matrix
+    traded = set(stock_keys.tolist())
+    not_found += [s for key, s in by_key.items() if key not in traded]
+    found = {key: s for key, s in by_key.items() if key in traded}
+    if not found:
+        raise HTTPException(status_code=404, detail="OHLCV not found")
+    if bench_key and bench_key not in traded:
+        raise HTTPException(status_code=404, detail="Benchmark OHLCV not found")
+    columns = list(found) + ([bench_key] if bench_key and bench_key not in found else [])
+
+    levels = returns.continuous_levels(stock_keys, close, splits, dividends, request.adjusted)
+    dates, matrix = returns.align(stock_keys, date_keys, levels, columns, request.missing)
+    if len(dates) < 3:
+        raise HTTPException(status_code=422, detail="Not enough overlapping trading days")
+    period = returns.period_returns(matrix, request.returns)
+    bench = period[:, columns.index(bench_key)] if bench_key else None
+    stats = returns.risk_stats(period[:, :len(found)], bench, request.periods_per_year)
+    mean = _float_list(stats["mean"])
+    volatility = _float_list(stats["volatility"])
+    beta = _float_list(stats["beta"]) if bench is not None else [None] * len(found)
+
+    body = json_bytes({
+        "source": request.source.strip(),
+        "benchmark": benchmark,
+        "symbols": list(found.values()),
+        "not_found": not_found,
+        "start_date": int(dates[0]),
+        "end_date": int(dates[-1]),
+        "observations": len(period),
+        "stats": {
+            symbol: {"mean_return": mean[i], "volatility": volatility[i], "beta": beta[i]}
+            for i, symbol in enumerate(found.values())
+        },
+        "correlation": [_float_list(row) for row in stats["correlation"]],
+        "covariance": [_float_list(row) for row in stats["covariance"]],
+    })
+    returns_cache.set(cache_key, body)
+    return Response(body, media_type="application/json")
 
 @app.get("/stock-ohlcv/latest/{symbol}", response_model=schemas.OhlcvOut)
-async def get_ohlcv_latest(symbol: str, db: AsyncSession = Depends(get_db)):
+async def get_ohlcv_latest(symbol: str, db: AsyncSession = Depends(get_read_db)):
+    """Latest OHLCV bar of a symbol; concurrent requests for the same symbol share one query."""
+    """
+    Sample URL: http://localhost:8000/stock-ohlcv/latest/RELIANCE
+    """
     stock_key = await resolve_stock(db, symbol)
 
-    stmt = select(models.FactOhlcv).where(models.FactOhlcv.stock_key == stock_key).order_by(models.FactOhlcv.date_key.desc()).limit(1)
-    result = await db.execute(stmt)
-    r = result.scalars().first()
-    if not r:
+    async def latest():
+        stmt = facts.OHLCV.select().where(models.FactOhlcv.stock_key == stock_key).order_by(models.FactOhlcv.date_key.desc()).limit(1)
+        async with replica_set.session() as session:
+            result = await session.execute(stmt)
+            rows = facts.OHLCV.dicts(result.all())
+        return json_bytes(rows[0]) if rows else None
+
+    body = await fact_flight.do(("ohlcv-latest", stock_key), latest)
+    if body is None:
         raise HTTPException(status_code=404, detail="OHLCV not found")
+    return Response(body, media_type="application/json")
+
+
+async def _stream_export(stmt, table, encoder):
+    """Run `stmt` on a server-side cursor and yield encoded chunks.
+
+    The export owns its session: the request's session is closed before a
+    streaming body is consumed, and the cursor must stay open until the last row.
     """
-    Sample URL: http://localhost:8000/stock-ohlcv/latest/RELIANCE
+    async with HeavySessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=settings.export_batch_size))
+        async for chunk in encoder(table, result):
+            yield chunk
+
+
+@app.get("/export/{dataset}")
+async def export_fact_history(
+    dataset: str,
+    symbol: str,
+    source: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Stream the full history of a fact table for one symbol as NDJSON or CSV.
+
+    dataset is one of: ohlcv, balance-sheet, cashflow, income, key-ratios, recommendations.
+    There is no row cap; rows are fetched in batches of EXPORT_BATCH_SIZE from a
+    server-side cursor so memory stays flat regardless of the date range.
+    fields= limits the columns exported, as on the range endpoints.
     """
-    return {
-        "traded_date": datetime.strptime(str(r.date_key), '%Y%m%d'),
-        "open_price": r.open_price,
-        "high_price": r.high_price,
-        "low_price": r.low_price,
-        "close_price": r.close_price,
-        "volume": r.volume,
+    """
+    Sample URL: http://localhost:8000/export/ohlcv?symbol=RELIANCE&source=YFIN&format=csv
+    """
+    table = FACT_TABLES.get(dataset)
+    if not table:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    table = _project(table, fields)
+    stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+
+    stmt = table.query(stock_key, source_key, start_date, end_date, descending=False)
+    encoder, media_type = STREAM_ENCODERS[format]
+    filename = f"{symbol.strip()}_{dataset}.{format}"
+    return StreamingResponse(
+        _stream_export(stmt, table, encoder),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/market/snapshot", response_model=schemas.MarketSnapshotOut)
+async def get_market_snapshot(
+    source: str,
+    symbols: str | None = None,
+    industry: str | None = None,
+    db: AsyncSession = Depends(get_heavy_db),
+):
+    """Latest OHLCV bar and key ratios for every stock, or a filtered subset.
+
+    symbols is a comma-separated list; industry matches dim_stock.industry case-insensitively.
+    Served from an in-memory snapshot rebuilt only when the fact tables are reloaded.
+    """
+    """
+    Sample URL: http://localhost:8000/market/snapshot?source=YFIN&industry=Banks
+    """
+    source_key = await dimension_cache.get_source_key(db, source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+    await market_snapshot.ensure_fresh(db)
+
+    stock_keys = None
+    if symbols:
+        stocks = await dimension_cache.get_stocks(db, [s for s in symbols.split(",") if s.strip()])
+        stock_keys = [stock.stock_key for stock in stocks.values()]
+    if industry:
+        wanted = industry.strip().lower()
+        in_industry = [s.stock_key for s in dimension_cache.stocks() if (s.industry or "").lower() == wanted]
+        if stock_keys is None:
+            stock_keys = in_industry
+        else:
+            industry_keys = set(in_industry)
+            stock_keys = [k for k in stock_keys if k in industry_keys]
+    return Response(market_snapshot.body(source_key, stock_keys), media_type="application/json")
+
+
+@app.get("/screener", response_model=schemas.ScreenerOut)
+async def screen_stocks(
+    source: str,
+    filter: List[str] = Query([]),
+    sort: str | None = None,
+    limit: int = Query(50, ge=1, le=5000),
+    db: AsyncSession = Depends(get_heavy_db),
+):
+    """Screen all stocks on their latest key ratios.
+
+    filter is repeatable as field:min:max with either bound optional, e.g.
+    filter=price_to_earnings::20&filter=return_on_equity:15:&filter=market_cap_rank::200.
+    Key-ratio output names and warehouse column names (pe, roe, ...) are both accepted.
+    sort takes a field, prefixed with "-" for descending. Answered from an in-memory
+    columnar snapshot refreshed when fact_key_ratios is reloaded.
+    """
+    """
+    Sample URL: http://localhost:8000/screener?source=YFIN&filter=pe::20&filter=roe:15:&sort=-market_cap&limit=20
+    """
+    filters = parse_filters(filter)
+    sort_field, descending = parse_sort(sort)
+    source_key = await dimension_cache.get_source_key(db, source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+    await dimension_cache.ensure_fresh(db)
+    await ratio_screener.ensure_fresh(db)
+
+    count, data = ratio_screener.screen(source_key, filters, sort_field, descending, limit)
+    body = {
+        "source": dimension_cache.source_name(source_key),
+        "as_of": ratio_screener.as_of,
+        "count": count,
+        "data": data,
     }
+    return Response(json_bytes(body), media_type="application/json")
+
+
+@app.get("/industries", response_model=schemas.IndustriesOut)
+async def list_industries(source: str, db: AsyncSession = Depends(get_heavy_db)):
+    """Every industry's aggregates on the latest trading day.
+
+    Served from in-memory daily aggregates that are extended as new fact_ohlcv
+    rows are loaded; see /industry-aggregates for the history.
+    """
+    """
+    Sample URL: http://localhost:8000/industries?source=YFIN
+    """
+    source_key = await dimension_cache.get_source_key(db, source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+    await industry_aggregates.ensure_fresh(db)
+
+    date_key, data = industry_aggregates.latest(source_key)
+    body = {
+        "source": dimension_cache.source_name(source_key),
+        "as_of": industry_aggregates.as_of,
+        "traded_date": facts.date_key_to_datetime(date_key) if date_key else None,
+        "data": data,
+    }
+    return Response(json_bytes(body), media_type="application/json")
+
+
+@app.get("/industry-aggregates", response_model=schemas.IndustryAggregatesOut)
+async def get_industry_aggregates(
+    industry: str,
+    source: str,
+    start_date: int | None = None,
+    end_date: int | None = None,
+    db: AsyncSession = Depends(get_heavy_db),
+):
+    """Daily aggregates of one industry (matched case-insensitively) as parallel arrays.
+
+    cap_weighted_return weights each member's split-adjusted return by its latest
+    market cap from fact_key_ratios dated before the day; equal_weighted_return is
+    the plain mean. Volume, advancers, decliners and unchanged count the members
+    that traded that day.
+    """
+    """
+    Sample URL: http://localhost:8000/industry-aggregates?industry=Banks&source=YFIN&start_date=20240101
+    """
+    source_key = await dimension_cache.get_source_key(db, source)
+    if not source_key:
+        raise HTTPException(status_code=404, detail="Source not found")
+    await industry_aggregates.ensure_fresh(db)
+
+    found = industry_aggregates.series(source_key, industry, start_date, end_date)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Industry not found")
+    name, dates, values = found
+    body = {
+        "industry": name,
+        "source": dimension_cache.source_name(source_key),
+        "as_of": industry_aggregates.as_of,
+        "traded_date": [facts.date_key_to_datetime(d) for d in dates.tolist()],
+        **{
+            field: _float_list(v) if field in RETURN_FIELDS else v.tolist()
+            for field, v in values.items()
+        },
+    }
+    return Response(json_bytes(body), media_type="application/json")
 
 
 @app.get("/sources", response_model=List[schemas.SourceOut])
-async def list_sources(db: AsyncSession = Depends(get_db)):
+async def list_sources(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(models.DimSource))
     rows = result.scalars().all()
     """
@@ -145,267 +928,154 @@ async def list_sources(db: AsyncSession = Depends(get_db)):
 
 @app.get("/stock-balance-sheet", response_model=List[schemas.BalanceSheetOut])
 async def get_balance_sheet(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,
     end_date: int | None = None,
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Sample URL: http://localhost:8000/stock-balance-sheet?symbol=RELIANCE&source=YFIN&start_date=20220101&limit=10
     """
+    table = _project(facts.BALANCE_SHEET, fields)
     stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    await _release(db)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.BALANCE_SHEET, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    stmt = select(models.FactBalanceSheet).where(models.FactBalanceSheet.stock_key == stock_key, models.FactBalanceSheet.source_key == source_key)
-    if start_date:
-        stmt = stmt.where(models.FactBalanceSheet.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactBalanceSheet.date_key <= end_date)
-    stmt = stmt.order_by(models.FactBalanceSheet.date_key.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
-
-    def map_row(r: models.FactBalanceSheet):
-        return {
-            "date_key": r.date_key,
-            "reporting_period": r.reporting_period,
-            "cash_and_short_term_investments": r.bal_csti,
-            "total_receivables": r.bal_trec,
-            "total_inventory": r.bal_tinv,
-            "other_current_assets": r.bal_oca,
-            "total_current_assets": r.bal_tca,
-            "net_loans": r.bal_netl,
-            "net_property_plant_and_equipment": r.bal_nppe,
-            "goodwill_and_intangibles": r.bal_gint,
-            "long_term_investments": r.bal_lti,
-            "other_assets": r.bal_otha,
-            "total_assets": r.bal_tota,
-            "accounts_payable": r.bal_accp,
-            "total_deposits": r.bal_tdep,
-            "other_current_liabilities": r.bal_ocl,
-            "total_current_liabilities": r.bal_tcl,
-            "total_long_term_debt": r.bal_tltd,
-            "total_debt": r.bal_tdeb,
-            "deferred_income_taxes": r.bal_dit,
-            "minority_interest": r.bal_mint,
-            "other_liabilities": r.bal_othl,
-            "total_liabilities": r.bal_totl,
-            "common_stock": r.bal_coms,
-            "additional_paid_in_capital": r.bal_apic,
-            "retained_earnings": r.bal_rtne,
-            "other_equity": r.bal_oeq,
-            "total_equity": r.bal_teq,
-            "total_liabilities_and_shareholders_equity": r.bal_tlse,
-            "total_common_shares_outstanding": r.bal_tcso,
-            "total_preferred_shares_outstanding": r.bal_tpso,
-            "net_current_assets": r.bal_nca,
-            "current_assets": r.bal_ca,
-            "net_current_liabilities": r.bal_ncl,
-            "deferred_tax_assets": r.bal_dta,
-        }
-
-    return [map_row(r) for r in rows]
+    stmt, after = _fact_query(table, stock_key, source_key, start_date, end_date, cursor)
+    key = (stock_key, source_key, start_date, end_date, cursor)
+    history = (stock_key, source_key, start_date, end_date, after)
+    return await _fact_response(table, fmt, symbol, stmt, limit, table.name, validators, key, history=history)
 
 
 @app.get("/stock-cashflow", response_model=List[schemas.CashflowOut])
 async def get_cashflow(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,
     end_date: int | None = None,
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Sample URL: http://localhost:8000/stock-cashflow?symbol=RELIANCE&source=YFIN&start_date=20220101&limit=10
     """
+    table = _project(facts.CASHFLOW, fields)
     stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    await _release(db)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.CASHFLOW, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    stmt = select(models.FactCashflow).where(models.FactCashflow.stock_key == stock_key, models.FactCashflow.source_key == source_key)
-    if start_date:
-        stmt = stmt.where(models.FactCashflow.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactCashflow.date_key <= end_date)
-    stmt = stmt.order_by(models.FactCashflow.date_key.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
-
-    def map_row(r: models.FactCashflow):
-        return {
-            "date_key": r.date_key,
-            "reporting_period": r.reporting_period,
-            "change_in_working_capital": r.caf_ciwc,
-            "cash_flow_from_operating_activities": r.caf_cfoa,
-            "capital_expenditures": r.caf_cexp,
-            "cash_flow_from_investing_activities": r.caf_cfia,
-            "total_cash_dividends_paid": r.caf_tcdp,
-            "cash_flow_from_financing_activities": r.caf_cffa,
-            "fee_or_expense_explanation": r.caf_fee,
-            "net_change_in_cash_and_cash_equivalents": r.caf_ncic,
-            "free_cash_flow": r.caf_fcf,
-        }
-
-    return [map_row(r) for r in rows]
+    stmt, after = _fact_query(table, stock_key, source_key, start_date, end_date, cursor)
+    key = (stock_key, source_key, start_date, end_date, cursor)
+    history = (stock_key, source_key, start_date, end_date, after)
+    return await _fact_response(table, fmt, symbol, stmt, limit, table.name, validators, key, history=history)
 
 
 @app.get("/stock-income", response_model=List[schemas.IncomeOut])
 async def get_income(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,
     end_date: int | None = None,
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Sample URL: http://localhost:8000/stock-income?symbol=RELIANCE&source=YFIN&start_date=20220101&limit=10
     """
+    table = _project(facts.INCOME, fields)
     stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    await _release(db)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.INCOME, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    stmt = select(models.FactIncome).where(models.FactIncome.stock_key == stock_key, models.FactIncome.source_key == source_key)
-    if start_date:
-        stmt = stmt.where(models.FactIncome.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactIncome.date_key <= end_date)
-    stmt = stmt.order_by(models.FactIncome.date_key.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
-
-    def map_row(r: models.FactIncome):
-        return {
-            "date_key": r.date_key,
-            "reporting_period": r.reporting_period,
-            "total_revenue": r.q_inc_trev,
-            "raw_material_costs": r.q_inc_raw,
-            "profit_from_core": r.q_inc_pfc,
-            "earnings_per_core": r.q_inc_epc,
-            "selling_general_admin_expenses": r.q_inc_sga,
-            "operating_expenses": r.q_inc_ope,
-            "earnings_before_interest": r.q_inc_ebi,
-            "depreciation": r.q_inc_dep,
-            "profit_before_interest": r.q_inc_pbi,
-            "income_from_other_investments": r.q_inc_ioi,
-            "profit_before_tax": r.q_inc_pbt,
-            "total_operating_income": r.q_inc_toi,
-            "net_income": r.q_inc_ninc,
-            "earnings_per_share": r.q_inc_eps,
-            "dividends_per_share": r.q_inc_dps,
-            "payout_ratio": r.q_inc_pyr,
-        }
-
-    return [map_row(r) for r in rows]
+    stmt, after = _fact_query(table, stock_key, source_key, start_date, end_date, cursor)
+    key = (stock_key, source_key, start_date, end_date, cursor)
+    history = (stock_key, source_key, start_date, end_date, after)
+    return await _fact_response(table, fmt, symbol, stmt, limit, table.name, validators, key, history=history)
 
 
 @app.get("/stock-key-ratios", response_model=List[schemas.KeyRatiosOut])
 async def get_key_ratios(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,
     end_date: int | None = None,
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Sample URL: http://localhost:8000/stock-key-ratios?symbol=RELIANCE&source=YFIN&start_date=20220101&limit=10
     """
+    table = _project(facts.KEY_RATIOS, fields)
     stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    await _release(db)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.KEY_RATIOS, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    stmt = select(models.FactKeyRatios).where(models.FactKeyRatios.stock_key == stock_key, models.FactKeyRatios.source_key == source_key)
-    if start_date:
-        stmt = stmt.where(models.FactKeyRatios.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactKeyRatios.date_key <= end_date)
-    stmt = stmt.order_by(models.FactKeyRatios.date_key.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
-
-    def map_row(r: models.FactKeyRatios):
-        return {
-            "date_key": r.date_key,
-            "risk": r.risk,
-            "three_month_average_volume": r.letter_3mavgvol,
-            "four_week_price_change_pct": r.letter_4wpct,
-            "fifty_two_week_high": r.letter_52whigh,
-            "fifty_two_week_low": r.letter_52wlow,
-            "fifty_two_week_price_change_pct": r.letter_52wpct,
-            "beta": r.beta,
-            "book_value_per_share": r.bps,
-            "dividend_yield": r.div_yield,
-            "earnings_per_share": r.eps,
-            "industry_dividend_yield": r.inddy,
-            "industry_price_to_book": r.indpb,
-            "industry_price_to_earnings": r.indpe,
-            "market_cap": r.market_cap,
-            "market_cap_rank": r.mrkt_cap_rank,
-            "price_to_book": r.pb,
-            "price_to_earnings": r.pe,
-            "return_on_equity": r.roe,
-            "number_of_shareholders": r.n_shareholders,
-            "last_traded_price": r.last_price,
-            "trailing_twelve_month_pe": r.ttm_pe,
-            "market_cap_label": r.market_cap_label,
-            "twelve_month_volume": r.letter_12mvol,
-            "market_cap_float": r.mrkt_capf,
-            "adjusted_pe_forward": r.apef,
-            "price_to_book_redundant": r.pbr,
-            "etf_liquidity": r.etf_liq,
-            "etf_liquidity_label": r.etf_liq_label,
-            "expense_ratio": r.expense_ratio,
-            "tracking_error": r.track_err,
-            "industry_expense_ratio": r.ind_expense_ratio,
-            "industry_tracking_error": r.ind_track_err,
-            "assets_under_management": r.asst_under_man,
-        }
-
-    return [map_row(r) for r in rows]
+    stmt, after = _fact_query(table, stock_key, source_key, start_date, end_date, cursor)
+    key = (stock_key, source_key, start_date, end_date, cursor)
+    history = (stock_key, source_key, start_date, end_date, after)
+    return await _fact_response(table, fmt, symbol, stmt, limit, table.name, validators, key, history=history)
 
 
 @app.get("/stock-recommendations", response_model=List[schemas.RecommendationsOut])
 async def get_recommendations(
+    request: Request,
     symbol: str,
     source: str,
     start_date: int | None = None,
     end_date: int | None = None,
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str | None = Query(None, pattern="^(json|columnar|arrow)$"),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Sample URL: http://localhost:8000/stock-recommendations?symbol=RELIANCE&source=YFIN&start_date=20220101&limit=10
     """
-    stock_res = await db.execute(select(models.DimStock.stock_key).where(models.DimStock.nk_symbol.ilike(symbol.strip())))
-    stock_key = stock_res.scalar_one_or_none()
-    if not stock_key:
-        raise HTTPException(status_code=404, detail="Stock not found")
-
-    source_res = await db.execute(select(models.DimSource.source_key).where(models.DimSource.source_name.ilike(source.strip())))
-    source_key = source_res.scalar_one_or_none()
-    if not source_key:
-        raise HTTPException(status_code=404, detail="Source not found")
-
-    stmt = select(models.FactRecommendations).where(models.FactRecommendations.stock_key == stock_key, models.FactRecommendations.source_key == source_key)
-    if start_date:
-        stmt = stmt.where(models.FactRecommendations.date_key >= start_date)
-    if end_date:
-        stmt = stmt.where(models.FactRecommendations.date_key <= end_date)
-    stmt = stmt.order_by(models.FactRecommendations.date_key.desc()).limit(limit)
-
-    result = await db.execute(stmt)
-    rows = result.scalars().all()
-
-    def map_row(r: models.FactRecommendations):
-        return {
-            "date_key": r.date_key,
-            "recommendation_period": r.recommendation_period,
-            "strong_buy": r.strong_buy,
-            "buy": r.buy,
-            "hold": r.hold,
-            "sell": r.sell,
-            "strong_sell": r.strong_sell,
-        }
+    table = _project(facts.RECOMMENDATIONS, fields)
+    stock_key, source_key = await resolve_stock_and_source(db, symbol, source)
+    await _release(db)
+    fmt = negotiate_format(format, accept)
+    validators = await fact_validators(facts.RECOMMENDATIONS, stock_key, source_key, request, fmt)
+    if validators.not_modified(request):
+        return validators.not_modified_response()
 
-    return [map_row(r) for r in rows]
+    stmt, after = _fact_query(table, stock_key, source_key, start_date, end_date, cursor)
+    key = (stock_key, source_key, start_date, end_date, cursor)
+    history = (stock_key, source_key, start_date, end_date, after)
+    return await _fact_response(table, fmt, symbol, stmt, limit, table.name, validators, key, history=history)
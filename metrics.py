@@ -0,0 +1,229 @@
+import functools
+import inspect
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestStats:
+    """Costs accumulated while handling one request."""
+    statements: int = 0
+    db_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    queue_seconds: float = 0.0
+    serialize_seconds: float = 0.0
+    endpoint_done: Optional[float] = None
+
+    def server_timing(self, total_seconds: float) -> str:
+        return ", ".join((
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} statements"',
+            f"pool;dur={self.pool_wait_seconds * 1000:.2f}",
+            f"queue;dur={self.queue_seconds * 1000:.2f}",
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}",
+            f"total;dur={total_seconds * 1000:.2f}",
+        ))
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled, or None outside a request (e.g. cache warm-up)."""
+    return _current.get()
+
+
+def record_serialize(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+
+
+class Histogram:
+    """Prometheus histogram with a fixed label set, rendered in the text exposition format."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body.", ("route", "method", "status"), SECONDS)
+DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL statements per request.", ("route",), SECONDS)
+DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.", ("route",), COUNTS)
+POOL_WAIT_SECONDS = Histogram(
+    "http_request_pool_wait_seconds", "Time spent waiting for a pooled connection per request.", ("route",), SECONDS)
+SERIALIZE_SECONDS = Histogram(
+    "http_request_serialize_seconds", "Time spent encoding response bodies per request.", ("route",), SECONDS)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "http_request_admission_wait_seconds", "Time spent queued for admission, by outcome (admitted, 429, 503).",
+    ("pool", "outcome"), SECONDS)
+HISTOGRAMS = (
+    REQUEST_SECONDS, DB_SECONDS, DB_STATEMENTS, POOL_WAIT_SECONDS, SERIALIZE_SECONDS, ADMISSION_WAIT_SECONDS,
+)
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render_metrics() -> str:
+    return "\n".join(line for h in HISTOGRAMS for line in h.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware that opens a RequestStats per request.
+
+    The stats are reported in a Server-Timing header and, once the body has been
+    sent, observed into the per-route histograms. Requests that match no route
+    are grouped under route="unmatched" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route, scope["method"], str(status))
+            DB_SECONDS.observe(stats.db_seconds, route)
+            DB_STATEMENTS.observe(stats.statements, route)
+            POOL_WAIT_SECONDS.observe(stats.pool_wait_seconds, route)
+            SERIALIZE_SECONDS.observe(stats.serialize_seconds, route)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that counts response_model validation and rendering as serialization.
+
+    FastAPI serializes the endpoint's return value after the endpoint returns, so
+    the time from the endpoint returning to the Response being ready is added to
+    the request's serialize time.
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if inspect.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def endpoint(*args, **kwargs):
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    stats = _current.get()
+                    if stats is not None:
+                        stats.endpoint_done = time.perf_counter()
+
+            self.dependant.call = endpoint
+
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            stats = _current.get()
+            if stats is not None and stats.endpoint_done is not None:
+                stats.serialize_seconds += time.perf_counter() - stats.endpoint_done
+                stats.endpoint_done = None
+            return response
+
+        return timed_handler
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Connection pool that records checkout wait against the current request."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait_seconds += time.perf_counter() - started
+
+
+def instrument_engine(engine: AsyncEngine, slow_query_ms: float = 0) -> None:
+    """Count statements and DB time per request; log statements slower than slow_query_ms (0 disables)."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            logger.warning("Slow query (%.1f ms): %s | parameters: %r", elapsed * 1000, statement, parameters)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute is skipped when a statement fails
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
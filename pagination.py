@@ -0,0 +1,46 @@
+import base64
+import binascii
+import json
+from typing import Any, Callable, Optional, Sequence, Union
+
+from fastapi import HTTPException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(scope: str, key: Union[int, tuple[int, ...]]) -> str:
+    """Opaque token holding the last key (or composite key) seen on a page of `scope`."""
+    raw = json.dumps({"s": scope, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(scope: str, token: str, parts: int = 1) -> Union[int, tuple[int, ...]]:
+    """Return the key stored in `token`, a tuple of `parts` ints for composite keys;
+    400 if it is malformed or from another listing.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        key = payload["k"]
+        if payload["s"] != scope:
+            raise ValueError(token)
+        if parts == 1:
+            if not isinstance(key, int):
+                raise ValueError(token)
+            return key
+        if not isinstance(key, list) or len(key) != parts or not all(isinstance(k, int) for k in key):
+            raise ValueError(token)
+        return tuple(key)
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(rows: Sequence, limit: int, scope: str, key: Callable[[Any], Any]) -> tuple[Sequence, Optional[str]]:
+    """Trim a `limit + 1` fetch to one page and build the cursor for the next one.
+
+    Queries ask for one extra row so we know whether another page exists without a COUNT.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(scope, key(rows[-1]))
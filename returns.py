@@ -0,0 +1,74 @@
+import numpy as np
+
+
+def continuous_levels(stock_keys: np.ndarray, close: np.ndarray, splits: np.ndarray,
+                      dividends: np.ndarray, adjusted: str | None) -> np.ndarray:
+    """Close prices made continuous across corporate actions, per stock.
+
+    Rows must be sorted by (stock_key, date_key). Each close is scaled by the
+    running product of the stock's split ratios (and, with "split+dividend", of
+    (close + dividend) / close on ex-dates), so day-over-day ratios of the result
+    are split-adjusted or total returns. Only ratios are meaningful; the scale
+    of each stock's series is arbitrary.
+    """
+    log_factor = np.zeros(len(close))
+    if adjusted:
+        log_factor += np.log(np.where(splits > 0, splits, 1.0))
+    if adjusted == "split+dividend":
+        log_factor += np.log1p(np.where(dividends > 0, dividends, 0.0) / close)
+    if not log_factor.any():
+        return close
+    running = np.cumsum(log_factor)
+    starts = np.flatnonzero(np.r_[True, stock_keys[1:] != stock_keys[:-1]])
+    # Restart the running product at each stock's first row
+    base = np.repeat(running[starts] - log_factor[starts], np.diff(np.r_[starts, len(close)]))
+    return close * np.exp(running - base)
+
+
+def align(stock_keys: np.ndarray, date_keys: np.ndarray, levels: np.ndarray,
+          columns: list[int], missing: str) -> tuple[np.ndarray, np.ndarray]:
+    """Pivot long rows into a dates x stocks matrix ordered like `columns`.
+
+    missing="drop" keeps only dates on which every stock traded; "ffill" carries
+    the last close over gaps and drops only the leading dates before every series
+    has started.
+    """
+    dates = np.unique(date_keys)
+    keys = np.asarray(columns)
+    order = np.argsort(keys)
+    col = order[np.searchsorted(keys[order], stock_keys)]
+    matrix = np.full((len(dates), len(keys)), np.nan)
+    matrix[np.searchsorted(dates, date_keys), col] = levels
+
+    if missing == "ffill":
+        rows = np.where(np.isnan(matrix), 0, np.arange(len(dates))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        matrix = matrix[rows, np.arange(len(keys))]
+    keep = ~np.isnan(matrix).any(axis=1)
+    return dates[keep], matrix[keep]
+
+
+def period_returns(levels: np.ndarray, kind: str) -> np.ndarray:
+    """Log or simple returns between consecutive rows."""
+    if kind == "log":
+        return np.diff(np.log(levels), axis=0)
+    return levels[1:] / levels[:-1] - 1
+
+
+def risk_stats(returns: np.ndarray, benchmark: np.ndarray | None, periods_per_year: int) -> dict:
+    """Annualized mean and volatility, beta, and correlation/covariance of per-period returns."""
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(std, std)
+        beta = None
+        if benchmark is not None:
+            centered = benchmark - benchmark.mean()
+            beta = centered @ (returns - returns.mean(axis=0)) / (centered @ centered)
+    return {
+        "mean": returns.mean(axis=0) * periods_per_year,
+        "volatility": std * np.sqrt(periods_per_year),
+        "beta": beta,
+        "correlation": np.clip(corr, -1.0, 1.0),
+        "covariance": cov,
+    }
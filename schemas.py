@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Optional, List, Dict
 from datetime import datetime
 
 class StockBase(BaseModel):
@@ -32,6 +32,7 @@ class OhlcvOut(BaseModel):
 class OhlcvList(BaseModel):
     symbol: str
     data: List[OhlcvOut]
+    next_cursor: Optional[str] = None
 
 
 class BalanceSheetOut(BaseModel):
@@ -178,3 +179,144 @@ class SourceOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class OhlcvBatchRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1, max_length=500)
+    source: str
+    start_date: Optional[int] = None  # YYYYMMDD integer
+    end_date: Optional[int] = None
+    limit: int = Field(1000, ge=1, le=10000)  # rows per symbol
+
+
+class OhlcvBatchOut(BaseModel):
+    source: str
+    data: Dict[str, List[OhlcvOut]]
+    not_found: List[str]
+
+
+class SnapshotEntry(BaseModel):
+    symbol: str
+    company_name: Optional[str] = None
+    industry: Optional[str] = None
+    ohlcv: Optional[OhlcvOut] = None
+    key_ratios: Optional[KeyRatiosOut] = None
+
+
+class MarketSnapshotOut(BaseModel):
+    source: str
+    as_of: Optional[datetime] = None
+    data: List[SnapshotEntry]
+
+
+class IndicatorsOut(BaseModel):
+    symbol: str
+    source: str
+    traded_date: List[datetime]
+    close: List[Optional[float]]
+    indicators: Dict[str, List[Optional[float]]]
+
+
+class StockProfileOut(BaseModel):
+    stock: StockOut
+    source: str
+    balance_sheet: List[BalanceSheetOut]
+    cashflow: List[CashflowOut]
+    income: List[IncomeOut]
+    key_ratios: List[KeyRatiosOut]
+    recommendations: List[RecommendationsOut]
+
+
+class ScreenerOut(BaseModel):
+    source: str
+    as_of: Optional[datetime] = None
+    count: int
+    data: List[Dict[str, Any]]
+
+
+class ReturnsRequest(BaseModel):
+    symbols: List[str] = Field(..., min_length=1, max_length=500)
+    source: str
+    benchmark: Optional[str] = None  # symbol to compute beta against
+    start_date: Optional[int] = None  # YYYYMMDD integer
+    end_date: Optional[int] = None
+    returns: str = Field("log", pattern="^(log|simple)$")
+    missing: str = Field("drop", pattern="^(drop|ffill)$")  # days a symbol did not trade
+    adjusted: Optional[str] = Field("split", pattern="^split([+]dividend)?$")
+    periods_per_year: int = Field(252, ge=1, le=366)
+
+
+class ReturnStats(BaseModel):
+    mean_return: Optional[float]
+    volatility: Optional[float]
+    beta: Optional[float] = None
+
+
+class ReturnsOut(BaseModel):
+    source: str
+    benchmark: Optional[str] = None
+    symbols: List[str]
+    not_found: List[str]
+    start_date: int
+    end_date: int
+    observations: int
+    stats: Dict[str, ReturnStats]
+    correlation: List[List[Optional[float]]]
+    covariance: List[List[Optional[float]]]
+
+
+class SearchHit(BaseModel):
+    symbol: str
+    company_name: Optional[str] = None
+    industry: Optional[str] = None
+    isin_code: Optional[str] = None
+    yfin_symbol: Optional[str] = None
+    matched: str  # symbol, isin_code, yfin_symbol, company_name or fuzzy
+    score: float
+
+
+class IndustryDay(BaseModel):
+    industry: str
+    cap_weighted_return: Optional[float] = None  # split-adjusted, weighted by prior market cap
+    equal_weighted_return: Optional[float] = None
+    volume: int
+    advancers: int
+    decliners: int
+    unchanged: int
+    members: int  # stocks of the industry that traded that day
+
+
+class IndustriesOut(BaseModel):
+    source: str
+    as_of: Optional[datetime] = None
+    traded_date: Optional[datetime] = None
+    data: List[IndustryDay]
+
+
+class IndustryAggregatesOut(BaseModel):
+    industry: str
+    source: str
+    as_of: Optional[datetime] = None
+    traded_date: List[datetime]
+    cap_weighted_return: List[Optional[float]]
+    equal_weighted_return: List[Optional[float]]
+    volume: List[int]
+    advancers: List[int]
+    decliners: List[int]
+    unchanged: List[int]
+    members: List[int]
+
+
+class ValuationOut(BaseModel):
+    symbol: str
+    source: str
+    traded_date: List[datetime]
+    close: List[Optional[float]]
+    earnings_per_share_ttm: List[Optional[float]]
+    book_value_per_share: List[Optional[float]]
+    price_to_earnings: List[Optional[float]]
+    price_to_book: List[Optional[float]]
+    price_to_sales: List[Optional[float]]
+    market_cap: List[Optional[float]]
+    enterprise_value: List[Optional[float]]
+    ev_to_ebit: List[Optional[float]]
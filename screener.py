@@ -0,0 +1,172 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import select, func, Float, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings
+from dimensions import dimension_cache
+from snapshot import latest_rows
+import facts
+import models
+
+# Numeric key-ratio fields that can be filtered and sorted on
+NUMERIC_FIELDS = [
+    name for name, col in facts.KEY_RATIOS.columns.items()
+    if name != "date_key" and isinstance(col.type, (Float, Integer))
+]
+INTEGER_FIELDS = {name for name in NUMERIC_FIELDS if isinstance(facts.KEY_RATIOS.columns[name].type, Integer)}
+# Accept the warehouse column names too (pe, roe, mrkt_cap_rank, ...)
+FIELD_ALIASES = {
+    **{facts.KEY_RATIOS.columns[name].key: name for name in NUMERIC_FIELDS},
+    **{name: name for name in NUMERIC_FIELDS},
+}
+
+
+@dataclass(frozen=True)
+class RangeFilter:
+    field: str
+    low: Optional[float]
+    high: Optional[float]
+
+
+def parse_filters(raw: list[str]) -> list[RangeFilter]:
+    """Parse "field:min:max" items; either bound may be empty ("pe::20", "roe:15:")."""
+    filters = []
+    for item in raw:
+        parts = item.split(":")
+        if len(parts) != 3 or parts[0].strip().lower() not in FIELD_ALIASES:
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {item}")
+        try:
+            low, high = (float(p) if p.strip() else None for p in parts[1:])
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {item}")
+        filters.append(RangeFilter(FIELD_ALIASES[parts[0].strip().lower()], low, high))
+    return filters
+
+
+def parse_sort(raw: Optional[str]) -> tuple[Optional[str], bool]:
+    """"-market_cap" -> ("market_cap", descending=True)."""
+    if not raw:
+        return None, False
+    descending = raw.startswith("-")
+    name = raw.lstrip("-+").strip().lower()
+    if name not in FIELD_ALIASES:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field: {raw}")
+    return FIELD_ALIASES[name], descending
+
+
+@dataclass
+class _Columns:
+    stock_keys: np.ndarray
+    date_keys: np.ndarray
+    values: dict[str, np.ndarray]
+
+
+class RatioScreener:
+    """Columnar snapshot of the latest fact_key_ratios row per stock and source.
+
+    One float64 array per numeric ratio, rebuilt when max(load_ts) of
+    fact_key_ratios changes (checked at most every `refresh_interval` seconds),
+    so screens run as NumPy masks without touching Postgres.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._columns: dict[int, _Columns] = {}
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def as_of(self):
+        return self._version[0] if self._version else None
+
+    async def _load(self, db: AsyncSession, version: tuple) -> None:
+        rows = await latest_rows(db, facts.KEY_RATIOS)
+        by_source: dict[int, list[tuple[int, dict]]] = {}
+        for (source_key, stock_key), row in rows.items():
+            by_source.setdefault(source_key, []).append((stock_key, row))
+
+        columns = {}
+        for source_key, entries in by_source.items():
+            columns[source_key] = _Columns(
+                stock_keys=np.array([k for k, _ in entries], dtype=np.int64),
+                date_keys=np.array([r["date_key"] for _, r in entries], dtype=np.int64),
+                values={
+                    name: np.array([r[name] for _, r in entries], dtype=np.float64)
+                    for name in NUMERIC_FIELDS
+                },
+            )
+        self._columns = columns
+        self._version = version
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        if self._version and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if self._version and self._lock.locked():
+            return
+        async with self._lock:
+            checked_at = time.monotonic()
+            if self._version and checked_at - self._checked_at < self.refresh_interval:
+                return
+            res = await db.execute(select(func.max(models.FactKeyRatios.load_ts)))
+            version = (res.scalar_one_or_none(),)
+            if version != self._version:
+                await self._load(db, version)
+            self._checked_at = checked_at
+
+    def screen(
+        self,
+        source_key: int,
+        filters: list[RangeFilter],
+        sort: Optional[str],
+        descending: bool,
+        limit: int,
+    ) -> tuple[int, list[dict]]:
+        """Return (number of matches, top `limit` matching rows)."""
+        cols = self._columns.get(source_key)
+        if cols is None:
+            return 0, []
+        mask = np.ones(len(cols.stock_keys), dtype=bool)
+        # NaN compares false, so stocks missing a filtered ratio drop out
+        for f in filters:
+            values = cols.values[f.field]
+            if f.low is not None:
+                mask &= values >= f.low
+            if f.high is not None:
+                mask &= values <= f.high
+        idx = np.flatnonzero(mask)
+
+        if sort:
+            key = cols.values[sort][idx]
+            # argsort puts NaN last; negate for descending so they stay last
+            idx = idx[np.argsort(-key if descending else key, kind="stable")]
+        else:
+            idx = idx[np.argsort(cols.stock_keys[idx], kind="stable")]
+        top = idx[:limit]
+
+        data = []
+        for i in top.tolist():
+            stock = dimension_cache.stock_by_key(int(cols.stock_keys[i]))
+            row = {
+                "symbol": stock.nk_symbol if stock else None,
+                "company_name": stock.company_name if stock else None,
+                "industry": stock.industry if stock else None,
+                "date_key": int(cols.date_keys[i]),
+            }
+            for name in NUMERIC_FIELDS:
+                value = cols.values[name][i]
+                if value != value:
+                    row[name] = None
+                else:
+                    row[name] = int(value) if name in INTEGER_FIELDS else float(value)
+            data.append(row)
+        return len(idx), data
+
+
+ratio_screener = RatioScreener(settings.snapshot_refresh_seconds)
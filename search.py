@@ -0,0 +1,171 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from dimensions import StockEntry, dimension_cache
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Suffixes that say nothing about which company is meant
+_STOPWORDS = {"ltd", "limited", "the", "and", "of", "co", "company", "inc", "corp", "corporation", "india"}
+# Minimum share of the query's trigrams a name must contain to count as a fuzzy match
+FUZZY_THRESHOLD = 0.4
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _PrefixIndex:
+    """Sorted keys; every key starting with a prefix is one contiguous range.
+
+    `rank[i]` orders entries by key length then symbol, so the best matches of a
+    short, broad prefix are picked with heapq.nsmallest instead of scoring the
+    whole range.
+    """
+
+    def __init__(self, pairs, symbol_of):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.values = [value for _, value in pairs]
+        order = sorted(range(len(pairs)), key=lambda i: (len(self.keys[i]), symbol_of(self.values[i])))
+        self.rank = [0] * len(pairs)
+        for position, i in enumerate(order):
+            self.rank[i] = position
+
+    def range(self, prefix: str) -> range:
+        return range(bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\uffff"))
+
+    def best(self, prefix: str, limit: int) -> list[int]:
+        """Indexes of the `limit` shortest keys starting with `prefix`."""
+        return heapq.nsmallest(limit, self.range(prefix), key=self.rank.__getitem__)
+
+
+class SearchIndex:
+    """In-memory typeahead index over dim_stock, rebuilt when the dimension cache reloads.
+
+    Symbols, Yahoo symbols and ISINs are matched by prefix; company names by token
+    prefix and, when those tiers don't fill the page, by trigram overlap to absorb
+    typos. Hits are ranked by match tier, then by how much of the key the query
+    covers, then alphabetically by symbol.
+    """
+
+    def __init__(self):
+        self._reloads = 0
+        self._built = False
+        self._stocks: dict[int, StockEntry] = {}
+
+    def _build(self) -> None:
+        stocks = {s.stock_key: s for s in dimension_cache.stocks()}
+        symbol_of = lambda k: stocks[k].nk_symbol
+        self._symbols = _PrefixIndex(((s.nk_symbol.strip().lower(), k) for k, s in stocks.items()), symbol_of)
+        self._yfin = _PrefixIndex(
+            ((s.yfin_symbol.strip().lower(), k) for k, s in stocks.items() if s.yfin_symbol), symbol_of)
+        self._isins = _PrefixIndex(
+            ((s.isin_code.strip().lower(), k) for k, s in stocks.items() if s.isin_code), symbol_of)
+
+        postings = defaultdict(set)
+        trigrams = defaultdict(set)
+        self._name_trigram_count = {}
+        for k, s in stocks.items():
+            if not s.company_name:
+                continue
+            tokens = [t for t in _tokens(s.company_name) if t not in _STOPWORDS]
+            for t in tokens:
+                postings[t].add(k)
+            grams = _trigrams(" ".join(tokens))
+            self._name_trigram_count[k] = len(grams)
+            for g in grams:
+                trigrams[g].add(k)
+        self._name_tokens = sorted(postings)
+        self._postings = {t: frozenset(keys) for t, keys in postings.items()}
+        self._trigrams = {g: frozenset(keys) for g, keys in trigrams.items()}
+        # Shorter names first, then symbol: the order company-name hits are ranked in
+        named = sorted((k for k, s in stocks.items() if s.company_name),
+                       key=lambda k: (len(stocks[k].company_name), stocks[k].nk_symbol))
+        self._name_rank = {k: position for position, k in enumerate(named)}
+        self._stocks = stocks
+        self._reloads = dimension_cache.reloads
+        self._built = True
+
+    def ensure_current(self) -> None:
+        """Rebuild after every dimension cache load, including admin reloads with an unchanged load_ts."""
+        if not self._built or self._reloads != dimension_cache.reloads:
+            self._build()
+
+    def _name_matches(self, word: str) -> frozenset:
+        """Stocks with a company-name token starting with `word`."""
+        lo = bisect_left(self._name_tokens, word)
+        hi = bisect_left(self._name_tokens, word + "\uffff")
+        if hi - lo == 1:
+            return self._postings[self._name_tokens[lo]]
+        return frozenset().union(*(self._postings[t] for t in self._name_tokens[lo:hi]))
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        q = query.strip().lower()
+        if not q:
+            return []
+        best: dict[int, tuple[float, str]] = {}
+
+        def hit(stock_key: int, score: float, matched: str) -> None:
+            if score > best.get(stock_key, (0.0,))[0]:
+                best[stock_key] = (score, matched)
+
+        # Tiers score in disjoint bands, so only each tier's own top `limit` can make the page
+        for index, base, spread, matched in (
+            (self._symbols, 90.0, 9.0, "symbol"),
+            (self._isins, 85.0, 5.0, "isin_code"),
+            (self._yfin, 80.0, 5.0, "yfin_symbol"),
+        ):
+            for i in index.best(q, limit):
+                key = index.keys[i]
+                score = 100.0 if matched == "symbol" and key == q else base + spread * len(q) / len(key)
+                hit(index.values[i], score, matched)
+
+        words = [t for t in _tokens(q) if t not in _STOPWORDS] or _tokens(q)
+        if words:
+            # Every query word must prefix some token of the name
+            candidates = self._name_matches(words[0])
+            for word in words[1:]:
+                if not candidates:
+                    break
+                candidates = candidates & self._name_matches(word)
+            for stock_key in heapq.nsmallest(limit, candidates, key=self._name_rank.__getitem__):
+                name = self._stocks[stock_key].company_name
+                hit(stock_key, 70.0 + 9.0 * min(1.0, len(q) / len(name)), "company_name")
+
+        if len(best) < limit and len(q) >= 3:
+            grams = _trigrams(" ".join(words))
+            counts = Counter()
+            for g in grams:
+                counts.update(self._trigrams.get(g, ()))
+            needed = FUZZY_THRESHOLD * len(grams)
+            for stock_key, shared in counts.most_common(4 * limit):
+                if shared < needed:
+                    break
+                # Dice coefficient between the query's and the name's trigram sets
+                similarity = 2 * shared / (len(grams) + self._name_trigram_count[stock_key])
+                hit(stock_key, 60.0 * similarity, "fuzzy")
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], self._stocks[item[0]].nk_symbol))[:limit]
+        hits = []
+        for stock_key, (score, matched) in ranked:
+            stock = self._stocks[stock_key]
+            hits.append({
+                "symbol": stock.nk_symbol,
+                "company_name": stock.company_name,
+                "industry": stock.industry,
+                "isin_code": stock.isin_code,
+                "yfin_symbol": stock.yfin_symbol,
+                "matched": matched,
+                "score": round(score, 2),
+            })
+        return hits
+
+
+search_index = SearchIndex()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from memo import BoundedCache
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls onto one in-flight execution.
+
+    The first caller for a key starts `fn()` as a task; callers arriving while it
+    runs await the same task, so N identical requests cost one query and one
+    serialization. Waiters are shielded from each other: a cancelled (disconnected)
+    caller doesn't cancel the shared task. Because the task can outlive the caller
+    that started it, `fn` must not use that caller's request session.
+
+    With `ttl` > 0 results are also kept for `ttl` seconds, so a burst arriving just
+    after the query finished is served from memory too. Exceptions are shared with
+    the current waiters but never cached.
+    """
+
+    def __init__(self, ttl: float = 0, maxsize: int = 1024):
+        self.ttl = ttl
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._results = BoundedCache(maxsize)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.ttl:
+            hit = self._results.get(key)
+            if hit is not None and hit[0] > time.monotonic():
+                return hit[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, fn))
+            # Retrieve the exception even if every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fn()
+            if self.ttl:
+                self._results.set(key, (time.monotonic() + self.ttl, value))
+            return value
+        finally:
+            del self._inflight[key]
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import settings
+from dimensions import dimension_cache
+from formats import json_bytes
+import facts
+import models
+
+
+async def latest_rows(db: AsyncSession, table: facts.FactTable) -> dict[tuple[int, int], dict]:
+    """Latest row per (source_key, stock_key) of a fact table, as output dicts."""
+    model = table.model
+    stmt = (
+        table.select()
+        .add_columns(model.source_key.label("_source_key"), model.stock_key.label("_stock_key"))
+        .distinct(model.source_key, model.stock_key)
+        .order_by(model.source_key, model.stock_key, model.date_key.desc())
+    )
+    res = await db.execute(stmt)
+    n = len(table.fields)
+    return {
+        (r[n], r[n + 1]): dict(zip(table.fields, table.convert_row(r[:n])))
+        for r in res
+    }
+
+
+class MarketSnapshot:
+    """Latest OHLCV bar and key-ratio row for every stock, per source.
+
+    Built with two DISTINCT ON queries whenever max(load_ts) of fact_ohlcv or
+    fact_key_ratios changes (checked at most every `refresh_interval` seconds),
+    then served from memory. Each stock's entry is pre-serialized to JSON, and
+    the whole-market body per source is kept as a single bytes object.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._fragments: dict[int, dict[int, bytes]] = {}
+        self._bodies: dict[int, bytes] = {}
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> Optional[tuple]:
+        """(max fact_ohlcv.load_ts, max fact_key_ratios.load_ts, dimension version) of the snapshot."""
+        return self._version
+
+    @property
+    def as_of(self):
+        """Latest load_ts across the tables in the snapshot."""
+        if not self._version:
+            return None
+        return max((ts for ts in self._version[:2] if ts), default=None)
+
+    async def _current_version(self, db: AsyncSession) -> tuple:
+        res = await db.execute(select(
+            select(func.max(models.FactOhlcv.load_ts)).scalar_subquery(),
+            select(func.max(models.FactKeyRatios.load_ts)).scalar_subquery(),
+        ))
+        return (*res.one(), dimension_cache.version)
+
+    async def _load(self, db: AsyncSession, version: tuple) -> None:
+        ohlcv = await latest_rows(db, facts.OHLCV)
+        ratios = await latest_rows(db, facts.KEY_RATIOS)
+
+        fragments: dict[int, dict[int, bytes]] = {}
+        for source_key, stock_key in sorted(ohlcv.keys() | ratios.keys()):
+            stock = dimension_cache.stock_by_key(stock_key)
+            if stock is None:
+                continue
+            fragments.setdefault(source_key, {})[stock_key] = json_bytes({
+                "symbol": stock.nk_symbol,
+                "company_name": stock.company_name,
+                "industry": stock.industry,
+                "ohlcv": ohlcv.get((source_key, stock_key)),
+                "key_ratios": ratios.get((source_key, stock_key)),
+            })
+        self._fragments = {
+            source_key: dict(sorted(entries.items(), key=lambda e: dimension_cache.stock_by_key(e[0]).nk_symbol))
+            for source_key, entries in fragments.items()
+        }
+        self._version = version
+        self._bodies = {}
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Rebuild if the fact tables were reloaded; readers keep the old copy meanwhile."""
+        if self._version and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        if self._version and self._lock.locked():
+            # A rebuild is already running; serve the previous snapshot instead of queueing
+            return
+        async with self._lock:
+            checked_at = time.monotonic()
+            if self._version and checked_at - self._checked_at < self.refresh_interval:
+                return
+            await dimension_cache.ensure_fresh(db)
+            version = await self._current_version(db)
+            if version != self._version:
+                await self._load(db, version)
+            self._checked_at = checked_at
+
+    def _envelope(self, source_key: int, fragments) -> bytes:
+        source = dimension_cache.source_name(source_key)
+        head = json_bytes({"source": source, "as_of": self.as_of})[:-1]
+        return head + b',"data":[' + b",".join(fragments) + b"]}"
+
+    def body(self, source_key: int, stock_keys: Optional[list[int]] = None) -> bytes:
+        """JSON body for the whole market or for `stock_keys`, assembled from cached fragments."""
+        entries = self._fragments.get(source_key, {})
+        if stock_keys is None:
+            body = self._bodies.get(source_key)
+            if body is None:
+                body = self._bodies[source_key] = self._envelope(source_key, entries.values())
+            return body
+        wanted = set(stock_keys)
+        return self._envelope(source_key, [frag for key, frag in entries.items() if key in wanted])
+
+
+market_snapshot = MarketSnapshot(settings.snapshot_refresh_seconds)
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+import numpy as np
+
+from facts import date_key_to_datetime
+
+# Output series, in response order
+FIELDS = (
+    "earnings_per_share_ttm",
+    "book_value_per_share",
+    "price_to_earnings",
+    "price_to_book",
+    "price_to_sales",
+    "market_cap",
+    "enterprise_value",
+    "ev_to_ebit",
+)
+# Four consecutive quarter ends lie at most ~275 days apart; a wider window is missing a quarter
+MAX_TTM_SPAN_DAYS = 300
+
+
+def _ordinals(date_keys: np.ndarray) -> np.ndarray:
+    return np.array([date_key_to_datetime(d).toordinal() for d in date_keys.tolist()], dtype=np.int64)
+
+
+def shift_days(date_keys: np.ndarray, days: int) -> np.ndarray:
+    """date_keys moved `days` calendar days later."""
+    if not days:
+        return date_keys
+    shifted = [date_key_to_datetime(d) + timedelta(days=days) for d in date_keys.tolist()]
+    return np.array([d.year * 10000 + d.month * 100 + d.day for d in shifted], dtype=np.int64)
+
+
+def as_of(dates: np.ndarray, known: np.ndarray) -> np.ndarray:
+    """Index of the latest `known` date on or before each of `dates`; -1 where there is none."""
+    return np.searchsorted(known, dates, side="right") - 1
+
+
+def latest_per_date(date_keys: np.ndarray, *columns: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Keep the last row of each date_key; rows must be sorted by (date_key, load_ts)."""
+    last = np.r_[date_keys[1:] != date_keys[:-1], True] if len(date_keys) else np.zeros(0, bool)
+    return (date_keys[last], *(c[last] for c in columns))
+
+
+def trailing_sum(values: np.ndarray, date_keys: np.ndarray, n: int = 4) -> np.ndarray:
+    """Sum of each row and the n-1 before it; NaN until n rows exist or when the window skips a quarter."""
+    out = np.full(len(values), np.nan)
+    if len(values) < n:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(values, n).sum(axis=1)
+    ordinals = _ordinals(date_keys)
+    complete = ordinals[n - 1:] - ordinals[:len(values) - n + 1] <= MAX_TTM_SPAN_DAYS
+    out[n - 1:] = np.where(complete, windows, np.nan)
+    return out
+
+
+def _pick(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """values[index] with NaN where index is -1."""
+    if not len(values):
+        return np.full(len(index), np.nan)
+    return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, NaN unless the denominator is positive."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def valuation_series(bars: dict, splits: dict, income: dict, balance: dict, lag_days: int = 0) -> dict:
+    """Daily valuation ratios from each close and the statements known on that day.
+
+    `bars` holds date_key/close, `splits` the stock's split events (date_key/ratio),
+    `income` quarterly date_key/eps/revenue/ebit and `balance` date_key/equity/
+    shares/debt/cash, each sorted by date_key with one row per date. A statement
+    dated d is used from d + `lag_days` on.
+
+    Per-share statement values are as reported, so prices and statements are
+    first restated on one share basis using the split events between them; a
+    split between a quarter end and a close doesn't distort P/E or P/B.
+    """
+    log_split = np.cumsum(np.log(np.where(splits["ratio"] > 0, splits["ratio"], 1.0)))
+
+    def basis(date_keys):
+        # Share basis of a date: product of split ratios up to and including it, as a multiplier
+        i = as_of(date_keys, splits["date_key"])
+        return np.exp(np.where(i >= 0, log_split[np.maximum(i, 0)] if len(log_split) else 0.0, 0.0))
+
+    dates = bars["date_key"]
+    day_basis = basis(dates)
+    price = bars["close"] * day_basis
+
+    eps_ttm = trailing_sum(income["eps"] * basis(income["date_key"]), income["date_key"])
+    revenue_ttm = trailing_sum(income["revenue"], income["date_key"])
+    ebit_ttm = trailing_sum(income["ebit"], income["date_key"])
+    i = as_of(dates, shift_days(income["date_key"], lag_days))
+    eps_at = _pick(eps_ttm, i)
+
+    shares = balance["shares"] / basis(balance["date_key"])
+    j = as_of(dates, shift_days(balance["date_key"], lag_days))
+    shares_at = _pick(shares, j)
+    book_at = _ratio(_pick(balance["equity"], j), shares_at)
+
+    market_cap = price * shares_at
+    # Missing debt or cash counts as none
+    enterprise_value = market_cap + np.nan_to_num(_pick(balance["debt"], j)) - np.nan_to_num(_pick(balance["cash"], j))
+    return {
+        "earnings_per_share_ttm": eps_at / day_basis,
+        "book_value_per_share": book_at / day_basis,
+        "price_to_earnings": _ratio(price, eps_at),
+        "price_to_book": _ratio(price, book_at),
+        "price_to_sales": _ratio(market_cap, _pick(revenue_ttm, i)),
+        "market_cap": market_cap,
+        "enterprise_value": enterprise_value,
+        "ev_to_ebit": _ratio(enterprise_value, _pick(ebit_ttm, i)),
+    }